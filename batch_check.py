@@ -0,0 +1,165 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import sys
+import json
+import argparse
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from non_word_checking import wordRegEx
+from spell_engine import SpellCheckEngine
+
+
+"""
+Part 1: Tokenize Documents
+"""
+def find_words(text: str) -> List[List[Tuple[int, int, str]]]:
+    """
+    Split a document into lines of (start, end, word), with offsets into the whole document.
+    Lines play the role of editor blocks: a word is only checked in context of the previous words on its line.
+    """
+    lines = []
+    offset = 0
+    for line in text.split('\n'):
+        lines.append([(offset + m.start(), offset + m.end(), m.group()) for m in wordRegEx.finditer(line)])
+        offset += len(line) + 1
+    return lines
+
+
+"""
+Part 2: Batch Checking
+"""
+class BatchChecker:
+    """
+    Checks batches of documents. Every unique word and every unique context window of a batch is checked
+    once, and the verdicts are shared by all documents of the batch. A window is a word with the words before it,
+    as many as the speller's context model looks at (one for the bigram model).
+    """
+    def __init__(self, speller: SpellCheckEngine):
+        self.speller = speller
+        self.history = speller.context_order - 1
+
+    def check_words(self, words: Iterable[str]) -> Dict:
+        """
+        Map each unique word to None when it is correct, or to its suggestions ranked by edit distance.
+        """
+        result = {}
+        for word in set(words):
+            if self.speller.check(word):
+                result[word] = None
+            else:
+                suggestions = self.speller.suggestions(word)
+                ranked = sorted(suggestions.items(), key=lambda item: (item[1], item[0]))
+                result[word] = [label.split()[0] for label, _ in ranked]
+        return result
+
+    def check_windows(self, windows: Iterable[Tuple[str, ...]]) -> Dict:
+        """
+        Map each unique window to None when its last word fits its context,
+        or to the real-word suggestions ranked by their context model score, as suggestions_context ranks them.
+        """
+        result = {}
+        for window in set(windows):
+            text = ' '.join(window)
+            if self.speller.check_context(text):
+                result[window] = None
+            else:
+                # With an unbounded k, every candidate that scores higher is returned, ranked
+                result[window] = [label.split()[0] for label in self.speller.suggestions_context(text, sys.maxsize)]
+        return result
+
+    def window(self, line: List[Tuple[int, int, str]], count: int) -> Tuple[str, ...]:
+        return tuple(word for _, _, word in line[max(0, count - self.history):count + 1])
+
+    def check_batch(self, documents: List[Tuple[str, str]]) -> List[Dict]:
+        """
+        Check a list of (doc_id, text) documents and return one result per document.
+        """
+        lines_per_doc = [find_words(text) for _, text in documents]
+
+        word_verdicts = self.check_words(word for lines in lines_per_doc for line in lines for _, _, word in line)
+        windows = []
+        for lines in lines_per_doc:
+            for line in lines:
+                for count in range(1, len(line)):
+                    if word_verdicts[line[count][2]] is None:
+                        windows.append(self.window(line, count))
+        window_verdicts = self.check_windows(windows)
+
+        results = []
+        for (doc_id, _), lines in zip(documents, lines_per_doc):
+            errors = []
+            for line in lines:
+                for count, (start, end, word) in enumerate(line):
+                    if word_verdicts[word] is not None:
+                        errors.append({'start': start, 'end': end, 'word': word, 'type': 'non-word',
+                                       'suggestions': word_verdicts[word]})
+                    elif count != 0 and window_verdicts[self.window(line, count)] is not None:
+                        errors.append({'start': start, 'end': end, 'word': word, 'type': 'real-word',
+                                       'previous': line[count - 1][2],
+                                       'suggestions': window_verdicts[self.window(line, count)]})
+            results.append({'id': doc_id, 'errors': errors})
+        return results
+
+    def check_stream(self, documents: Iterable[Tuple[str, str]], batch_size: int = 64) -> Iterator[Dict]:
+        """
+        Check a stream of (doc_id, text) documents batch by batch, yielding results in input order.
+        """
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield from self.check_batch(batch)
+                batch = []
+        if batch:
+            yield from self.check_batch(batch)
+
+
+def check_document(speller: SpellCheckEngine, text: str) -> List[Dict]:
+    """
+    Return every non-word and real-word error of a single document.
+    """
+    return BatchChecker(speller).check_batch([(None, text)])[0]['errors']
+
+
+"""
+Part 3: Command Line Interface
+"""
+def read_documents(paths: List[str], jsonl: bool) -> Iterator[Tuple[str, str]]:
+    if jsonl:
+        for line in sys.stdin:
+            if line.strip():
+                document = json.loads(line)
+                yield document.get('id'), document['text']
+        return
+
+    if not paths:
+        yield '-', sys.stdin.read()
+    for path in paths:
+        with open(path, 'rt', encoding="ISO-8859-1") as file:
+            yield path, file.read()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Proofread documents and print one JSON line of errors per document.')
+    parser.add_argument('paths', nargs='*', help='documents to check; standard input when omitted')
+    parser.add_argument('--jsonl', action='store_true', help='read {"id": ..., "text": ...} lines from standard input')
+    parser.add_argument('--batch-size', type=int, default=64, help='documents whose words are checked together')
+    parser.add_argument('--corpus', default='./data/*.txt', help='corpus files of the language model')
+    parser.add_argument('--snapshot', default='./data/model.snapshot', help='compiled language model snapshot')
+    parser.add_argument('--context-model', default='laplace', choices=['laplace', 'stupid_backoff', 'kneser_ney'])
+    parser.add_argument('--order', type=int, default=3, help='n-gram order of the stupid_backoff and kneser_ney models')
+    args = parser.parse_args(argv)
+
+    checker = BatchChecker(SpellCheckEngine(args.corpus, args.snapshot, context_model=args.context_model, order=args.order))
+    for result in checker.check_stream(read_documents(args.paths, args.jsonl), args.batch_size):
+        sys.stdout.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
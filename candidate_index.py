@@ -0,0 +1,365 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+    https://github.com/wolfgarbe/SymSpell
+    http://stevehanov.ca/blog/?id=114 (fuzzy search of a trie, one edit-distance row per node)
+"""
+
+from array import array
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+import metrics
+
+
+# Letters that may be inserted or substituted when generating candidates
+ALPHABET = frozenset('abcdefghijklmnopqrstuvwxyz')
+
+
+"""
+Part 1: Deletion Neighborhood
+"""
+def deletes(word: str, max_distance: int) -> Set[str]:
+    """
+    All strings obtained by deleting up to max_distance characters from word, including word itself.
+    """
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = set(w[:i] + w[i + 1:] for w in frontier for i in range(len(w)))
+        result |= frontier
+    return result
+
+
+"""
+Part 2: Candidate Verification
+"""
+def damerau_levenshtein(s: str, t: str, alphabet=None) -> float:
+    """
+    Unrestricted Damerau-Levenshtein distance (Lowrance-Wagner), i.e. the fewest insertions, deletions,
+    replacements and adjacent transpositions turning s into t.
+    When an alphabet is given, characters may only be inserted or replaced with letters of that alphabet,
+    matching the strings generated by non_word_checking.edit_distance; unreachable pairs get math.inf.
+    """
+    inf = float('inf')
+    m, n = len(s), len(t)
+    allowed = [alphabet is None or c in alphabet for c in t]
+    # blocked[j]: number of characters of t[:j] that cannot be inserted
+    blocked = [0] * (n + 1)
+    for j in range(n):
+        blocked[j + 1] = blocked[j] + (not allowed[j])
+
+    d = [[inf] * (n + 2) for _ in range(m + 2)]
+    for i in range(m + 1):
+        d[i + 1][1] = i
+    for j in range(n + 1):
+        d[1][j + 1] = j if blocked[j] == 0 else inf
+
+    da = {}
+    for i in range(1, m + 1):
+        db = 0
+        for j in range(1, n + 1):
+            k = da.get(t[j - 1], 0)
+            l = db
+            if s[i - 1] == t[j - 1]:
+                cost = 0
+                db = j
+            else:
+                cost = 1 if allowed[j - 1] else inf
+            transpose = inf
+            if k > 0 and l > 0 and blocked[j - 1] - blocked[l] == 0:
+                transpose = d[k][l] + (i - k - 1) + 1 + (j - l - 1)
+            d[i + 1][j + 1] = min(d[i][j] + cost,
+                                  d[i + 1][j] + (1 if allowed[j - 1] else inf),
+                                  d[i][j + 1] + 1,
+                                  transpose)
+        da[s[i - 1]] = i
+
+    return d[m + 1][n + 1]
+
+
+"""
+Part 3: Deletion Index
+"""
+class DeletionIndex:
+    """
+    SymSpell-style index mapping every deletion variant of a vocabulary word to the words producing it.
+    Two words within edit distance d always share a variant reachable by at most d deletions from each,
+    so a lookup only has to probe the deletion variants of the query instead of every possible edit.
+    """
+    def __init__(self, words: Iterable[str], max_distance: int = 2, alphabet=None):
+        self.max_distance = max_distance
+        self.alphabet = alphabet
+        self.index: Dict[str, List[str]] = {}
+        for word in words:
+            for variant in deletes(word, max_distance):
+                self.index.setdefault(variant, []).append(word)
+
+    @metrics.timed('deletion_index_lookup_seconds')
+    def lookup(self, word: str, max_distance: int = 1) -> Set[str]:
+        """
+        Return every indexed word within max_distance edits of word, the word itself included.
+        Edits are those of non_word_checking.edit_distance, so the result equals
+        edit_distance(word, alphabet) & vocabulary for max_distance=1 and the edit_distance2 set for 2.
+        """
+        if max_distance > self.max_distance:
+            raise ValueError('Index was built for edit distances up to ' + str(self.max_distance))
+
+        result = set()
+        seen = set()
+        for variant in deletes(word, max_distance):
+            for candidate in self.index.get(variant, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if abs(len(candidate) - len(word)) > max_distance:
+                    continue
+                if candidate == word or damerau_levenshtein(word, candidate, self.alphabet) <= max_distance:
+                    result.add(candidate)
+        return result
+
+    def add(self, word: str):
+        for variant in deletes(word, self.max_distance):
+            words = self.index.setdefault(variant, [])
+            if word not in words:
+                words.append(word)
+
+    def remove(self, word: str):
+        for variant in deletes(word, self.max_distance):
+            words = self.index.get(variant)
+            if words is not None and word in words:
+                words.remove(word)
+                if not words:
+                    del self.index[variant]
+
+
+"""
+Part 4: Vocabulary Trie
+"""
+class VocabularyTrie:
+    """
+    Compact prefix tree over the vocabulary, with the lookup, add and remove methods of DeletionIndex.
+    Nodes are numbered breadth first, so the children of a node are consecutive and end where the children of the
+    next node start: a node only stores the letter leading to it (one character of labels), the number of its
+    first child and whether a word ends there. Words are never stored as strings; they are spelled out while traversing.
+    Words added after construction are kept in a small set beside the arrays.
+    """
+    def __init__(self, words: Iterable[str], alphabet=None):
+        self.alphabet = alphabet
+        words = sorted(set(words))
+
+        labels = ['\0']
+        first = array('i')
+        self.terminal = bytearray()
+        # Every node covers the range of sorted words starting with its prefix
+        queue = deque([(0, len(words), 0)])
+        while queue:
+            lo, hi, depth = queue.popleft()
+            # The prefix itself sorts before every longer word starting with it
+            ends = lo < hi and len(words[lo]) == depth
+            self.terminal.append(ends)
+            lo += ends
+            first.append(len(labels))
+            while lo < hi:
+                letter = words[lo][depth]
+                end = lo + 1
+                while end < hi and words[end][depth] == letter:
+                    end += 1
+                labels.append(letter)
+                queue.append((lo, end, depth + 1))
+                lo = end
+        # The children of the last node end with the labels
+        first.append(len(labels))
+
+        self.labels = ''.join(labels)
+        self.first = first
+        self.extra: Set[str] = set()
+
+    def _find(self, word: str) -> int:
+        # Node spelling word, or -1
+        node = 0
+        for letter in word:
+            node = self.labels.find(letter, self.first[node], self.first[node + 1])
+            if node < 0:
+                return -1
+        return node
+
+    def __contains__(self, word: str) -> bool:
+        node = self._find(word)
+        return (node >= 0 and self.terminal[node] == 1) or word in self.extra
+
+    @metrics.timed('vocabulary_trie_lookup_seconds')
+    def lookup(self, word: str, max_distance: int = 1) -> Set[str]:
+        """
+        Return every word within max_distance edits of word, the word itself included, like DeletionIndex.lookup.
+        The trie is walked depth first with one row of the damerau_levenshtein table per node, the candidate
+        spelled by the path against every prefix of word. A subtree is left once every entry of its row exceeds
+        max_distance: a transposition spanning the node costs at least as much as inserting up to it.
+        """
+        inf = float('inf')
+        alphabet, labels, first, terminal = self.alphabet, self.labels, self.first, self.terminal
+        n = len(word)
+        columns = range(1, n + 1)
+
+        result = set(w for w in self.extra if abs(len(w) - n) <= max_distance
+                     and damerau_levenshtein(word, w, alphabet) <= max_distance)
+        if terminal[0] and n <= max_distance:
+            result.add('')
+
+        # Rows of the nodes on the current path, the root's first, and the letters leading to them
+        rows = [list(range(n + 1))]
+        path = []
+        # blocked[i]: letters outside the alphabet among the first i of the path
+        blocked = [0]
+        # Deepest row of the path reached by each letter
+        last_row = {}
+
+        def visit(node: int):
+            letter = labels[node]
+            allowed = alphabet is None or letter in alphabet
+            step = 1 if allowed else inf
+            i = len(rows)
+            previous = rows[-1]
+            row = [previous[0] + step]
+            # Last column matching letter so far
+            db = 0
+            for j in columns:
+                query_letter = word[j - 1]
+                if query_letter == letter:
+                    # A transposition never beats the match
+                    cost = previous[j - 1]
+                    db = j
+                else:
+                    cost = previous[j - 1] + step
+                    if db:
+                        k = last_row.get(query_letter, 0)
+                        if k and blocked[i - 1] == blocked[k]:
+                            transpose = rows[k - 1][db - 1] + (i - k) + (j - db) - 1
+                            if transpose < cost:
+                                cost = transpose
+                if previous[j] + step < cost:
+                    cost = previous[j] + step
+                if row[j - 1] + 1 < cost:
+                    cost = row[j - 1] + 1
+                row.append(cost)
+
+            path.append(letter)
+            if terminal[node] and row[n] <= max_distance:
+                result.add(''.join(path))
+            # Letters outside the alphabet cannot be inserted, which voids the pruning bound, but not the length bound
+            if min(row) <= max_distance or (blocked[-1] + (not allowed) > 0 and i < n + max_distance):
+                rows.append(row)
+                blocked.append(blocked[-1] + (not allowed))
+                saved = last_row.get(letter)
+                last_row[letter] = i
+                for child in range(first[node], first[node + 1]):
+                    visit(child)
+                if saved is None:
+                    del last_row[letter]
+                else:
+                    last_row[letter] = saved
+                blocked.pop()
+                rows.pop()
+            path.pop()
+
+        for child in range(first[0], first[1]):
+            visit(child)
+        return result
+
+    def add(self, word: str):
+        node = self._find(word)
+        if node >= 0:
+            self.terminal[node] = 1
+        else:
+            self.extra.add(word)
+
+    def remove(self, word: str):
+        self.extra.discard(word)
+        node = self._find(word)
+        if node >= 0:
+            self.terminal[node] = 0
+
+
+"""
+Part 5: Confusion Sets
+"""
+def confusion_set(index, word: str) -> List[str]:
+    """
+    Sorted words that word may have been confused with: the indexed words one edit away from it, or two edits
+    away when there are none, except word itself and the empty word.
+    """
+    result = index.lookup(word, 1) - {word}
+    if len(result) == 0:
+        result = index.lookup(word, 2) - {word}
+    result.discard('')
+    return sorted(result)
+
+
+class ConfusionTable:
+    """
+    Confusion set of every vocabulary word, as CSR rows of word IDs like the bigram table: the row of a word ID
+    lists the IDs of its confusion set. Words that only occur in bigrams have empty rows. Built once per vocabulary and stored in the model snapshot, so it is only
+    computed when the snapshot is compiled. Sets changed by online updates are kept in a dict on top.
+    """
+    def __init__(self, index, offsets, ids, word_id: Callable[[str], Optional[int]], word: Callable[[int], str]):
+        self.index = index
+        self.offsets = offsets
+        self.ids = ids
+        self.word_id = word_id
+        self.word = word
+        # Number of rows; words with larger IDs were added after the table was built
+        self.size = len(offsets) - 1
+        self.changed: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def rows(index, words: List[str], word_id: Callable[[str], Optional[int]], size: int):
+        """
+        Offsets and IDs of the confusion sets of words, for a table of size rows.
+        """
+        sets = [[] for _ in range(size)]
+        for word in words:
+            sets[word_id(word)] = [word_id(c) for c in confusion_set(index, word)]
+        offsets = np.zeros(size + 1, dtype=np.uint64)
+        offsets[1:] = np.cumsum([len(row) for row in sets], dtype=np.uint64)
+        ids = np.fromiter((i for row in sets for i in row), dtype=np.uint32, count=int(offsets[-1]))
+        return offsets, ids
+
+    def candidates(self, word: str, word_id: int = None) -> List[str]:
+        """
+        Confusion set of a vocabulary word; word_id saves looking the word up again.
+        """
+        candidates = self.changed.get(word)
+        if candidates is not None:
+            return list(candidates)
+        if word_id is None:
+            word_id = self.word_id(word)
+        if word_id is None or word_id >= self.size:
+            return confusion_set(self.index, word)
+        start, end = int(self.offsets[word_id]), int(self.offsets[word_id + 1])
+        return [self.word(i) for i in self.ids[start:end].tolist()]
+
+    def update(self, word: str):
+        """
+        Recompute the sets that may change when word was added to or removed from the index: those of the words
+        within two edits of it.
+        """
+        for other in self.index.lookup(word, 2) | {word}:
+            self.changed[other] = confusion_set(self.index, other)
+
+    def bounds(self, max_counts: np.ndarray) -> np.ndarray:
+        """
+        For every vocabulary word ID, the largest of max_counts over its confusion set (0 for an empty set).
+        """
+        result = np.zeros(len(max_counts), dtype=np.int64)
+        rows = np.repeat(np.arange(self.size), np.diff(self.offsets).astype(np.intp))
+        np.maximum.at(result, rows, max_counts[self.ids.astype(np.intp)])
+        for word, candidates in self.changed.items():
+            word_id = self.word_id(word)
+            if word_id is not None:
+                counts = [int(max_counts[i]) for i in map(self.word_id, candidates) if i is not None]
+                result[word_id] = max(counts, default=0)
+        return result
@@ -0,0 +1,496 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+    https://en.wikipedia.org/wiki/Bloom_filter
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import hashlib
+import argparse
+import tracemalloc
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+import candidate_index
+import model_builder
+import real_word_checking
+
+
+"""
+Part 1: Bloom Filter
+"""
+class BloomFilter:
+    """
+    Set membership in a fixed bit array: a word is reported as present when all of its hash_count bits are set.
+    Words that were added are always found; other words are wrongly found with about the error rate the filter
+    was sized for. Bit positions come from a blake2b digest with double hashing, so they are the same in every process.
+    """
+    def __init__(self, size: int, hash_count: int, bits: np.ndarray = None):
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = np.zeros((size + 7) // 8, dtype=np.uint8) if bits is None else bits
+        # Indexing a memoryview of the bits returns plain ints, much faster than indexing the array
+        self._view = memoryview(self.bits)
+
+    @classmethod
+    def from_words(cls, words: Iterable[str], error_rate: float = 0.01):
+        words = list(words)
+        # Optimal sizes for n words: m = -n ln(p) / ln(2)^2 bits and k = m / n ln(2) hash functions
+        size = max(8, int(math.ceil(-len(words) * math.log(error_rate) / math.log(2) ** 2)))
+        hash_count = max(1, int(round(size / max(1, len(words)) * math.log(2))))
+        bloom = cls(size, hash_count)
+        for word in words:
+            bloom.add(word)
+        return bloom
+
+    @staticmethod
+    def _hashes(word: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    def add(self, word: str):
+        h1, h2 = self._hashes(word)
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, word: str) -> bool:
+        # Most absent words miss on the first bits, so the check stops at the first unset one
+        view = self._view
+        h1, h2 = self._hashes(word)
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % self.size
+            if not view[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+
+"""
+Part 2: Quantization
+"""
+def quantize(values: np.ndarray, bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Replace every value by a code of bits bits and return the codes and the codebook, so that
+    codebook[codes] approximates values. The codebook spreads 2**bits levels evenly between the smallest and the
+    largest value, which bounds the error of every value by half a step; values with fewer distinct entries
+    than that are kept exactly.
+    """
+    if not 1 <= bits <= 16:
+        raise ValueError('Quantization bits must be between 1 and 16')
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    values = np.asarray(values, dtype=np.float64)
+    distinct = np.unique(values)
+    if len(distinct) <= 1 << bits:
+        return np.searchsorted(distinct, values).astype(dtype), distinct
+    lo, step = distinct[0], (distinct[-1] - distinct[0]) / ((1 << bits) - 1)
+    codes = np.rint((values - lo) / step)
+    return codes.astype(dtype), lo + step * np.arange(1 << bits)
+
+
+"""
+Part 3: Compressed Bigram Model
+"""
+class CompressedBigramModel:
+    """
+    Read-only counterpart of real_word_checking.CompactBigramModel for low-memory deployments.
+    Bigrams seen fewer than min_count times are dropped, and the Laplace-smoothed log-probabilities are stored as
+    quantized codes instead of counts: log P(w | p) of every kept bigram, log P(w | p) of an unseen successor
+    per history (its smoothing denominator), and log P(w) of every word for ranking non-word corrections.
+    A dropped bigram scores like an unseen one. The vocabulary is a sorted utf-8 blob searched like
+    model_snapshot; with a Bloom filter, vocabulary checks skip the search and may accept a few non-words.
+    """
+    def __init__(self, word_blob: bytes, word_offsets, known, unigram_types: int, row_offsets, successors,
+                 bigram_codes, bigram_codebook, unseen_codes, unseen_codebook, unigram_codes, unigram_codebook,
+                 bloom: BloomFilter = None):
+        self.word_blob = word_blob
+        self.word_offsets = word_offsets
+        # base_size as in CompactBigramModel: every word ID has a row in the tables
+        self.vocab_size = self.base_size = len(word_offsets) - 1
+        # Words counted as unigrams; the others (<SOS>, <EOS>) only occur inside bigrams
+        self.known = known
+        self.unigram_types = unigram_types
+        self.row_offsets = row_offsets
+        self.successors = successors
+        self.bigram_codes = bigram_codes
+        self.bigram_codebook = bigram_codebook
+        self.unseen_codes = unseen_codes
+        self.unseen_codebook = unseen_codebook
+        self.unigram_codes = unigram_codes
+        self.unigram_codebook = unigram_codebook
+        self.bloom = bloom
+        self.log_unknown_denominator = math.log(unigram_types + 1)
+        # Offsets and IDs of a candidate_index.ConfusionTable over the vocabulary, saved with the model when set
+        self.confusion_rows = None
+
+    @classmethod
+    def build(cls, freq_dict_unigram: Dict, freq_dict_bigram: Dict, min_count: int = 2, bits: int = 8,
+              bloom_error_rate: float = None):
+        """
+        Compress the count dictionaries of real_word_checking.language_model. min_count=1 keeps every bigram;
+        bloom_error_rate adds a Bloom filter over the vocabulary with that false positive rate.
+        """
+        kept = {key: count for key, count in freq_dict_bigram.items() if count >= min_count}
+        words = set(freq_dict_unigram)
+        for prev_word, word in kept:
+            words.add(prev_word)
+            words.add(word)
+        encoded = sorted(w.encode('utf-8') for w in words)
+        word_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        word_offsets[1:] = np.cumsum([len(w) for w in encoded])
+        ids = {w.decode('utf-8'): i for i, w in enumerate(encoded)}
+        vocab_size = len(ids)
+
+        unigram_counts = np.zeros(vocab_size, dtype=np.int64)
+        for word, count in freq_dict_unigram.items():
+            unigram_counts[ids[word]] = count
+        unigram_types = len(freq_dict_unigram)
+        log_denominators = np.log(unigram_counts.astype(np.float64) + (unigram_types + 1))
+        # Words outside the unigram counts get the smallest code; they are never ranked
+        total = max(1, int(unigram_counts.sum()))
+        log_unigrams = np.log(np.maximum(unigram_counts, 1) / total)
+
+        size = len(kept)
+        prev_ids = np.fromiter((ids[p] for p, _ in kept), dtype=np.int64, count=size)
+        word_ids = np.fromiter((ids[w] for _, w in kept), dtype=np.int64, count=size)
+        counts = np.fromiter(kept.values(), dtype=np.float64, count=size)
+        order = np.lexsort((word_ids, prev_ids))
+        row_offsets = np.zeros(vocab_size + 1, dtype=np.uint32)
+        row_offsets[1:] = np.cumsum(np.bincount(prev_ids, minlength=vocab_size))
+        log_bigrams = np.log1p(counts[order]) - log_denominators[prev_ids[order]]
+
+        bigram_codes, bigram_codebook = quantize(log_bigrams, bits)
+        unseen_codes, unseen_codebook = quantize(-log_denominators, bits)
+        unigram_codes, unigram_codebook = quantize(log_unigrams, bits)
+        bloom = BloomFilter.from_words(freq_dict_unigram, bloom_error_rate) if bloom_error_rate else None
+        successor_type = np.uint16 if vocab_size <= 1 << 16 else np.uint32
+        return cls(b''.join(encoded), word_offsets, unigram_counts > 0, unigram_types, row_offsets,
+                   word_ids[order].astype(successor_type), bigram_codes, bigram_codebook, unseen_codes,
+                   unseen_codebook, unigram_codes, unigram_codebook, bloom)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        bloom = None
+        if 'bloom_bits' in arrays:
+            bloom = BloomFilter(int(arrays['bloom_shape'][0]), int(arrays['bloom_shape'][1]), arrays['bloom_bits'])
+        model = cls(arrays['word_blob'].tobytes(), arrays['word_offsets'], arrays['known'], int(arrays['unigram_types']),
+                    arrays['row_offsets'], arrays['successors'], arrays['bigram_codes'], arrays['bigram_codebook'],
+                    arrays['unseen_codes'], arrays['unseen_codebook'], arrays['unigram_codes'], arrays['unigram_codebook'],
+                    bloom)
+        if 'confusion_ids' in arrays:
+            model.confusion_rows = (arrays['confusion_offsets'], arrays['confusion_ids'])
+        return model
+
+    def save(self, path: str):
+        arrays = dict(word_blob=np.frombuffer(self.word_blob, dtype=np.uint8), word_offsets=self.word_offsets,
+                      known=self.known, unigram_types=np.array(self.unigram_types), row_offsets=self.row_offsets,
+                      successors=self.successors, bigram_codes=self.bigram_codes, bigram_codebook=self.bigram_codebook,
+                      unseen_codes=self.unseen_codes, unseen_codebook=self.unseen_codebook,
+                      unigram_codes=self.unigram_codes, unigram_codebook=self.unigram_codebook)
+        if self.bloom is not None:
+            arrays.update(bloom_bits=self.bloom.bits, bloom_shape=np.array([self.bloom.size, self.bloom.hash_count]))
+        if self.confusion_rows is not None:
+            arrays.update(confusion_offsets=self.confusion_rows[0], confusion_ids=self.confusion_rows[1])
+        with open(path, 'wb') as file:
+            np.savez(file, **arrays)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes held by the model's arrays, Bloom filter included.
+        """
+        arrays = (self.word_offsets, self.known, self.row_offsets, self.successors, self.bigram_codes, self.bigram_codebook,
+                  self.unseen_codes, self.unseen_codebook, self.unigram_codes, self.unigram_codebook)
+        return len(self.word_blob) + sum(a.nbytes for a in arrays) + (self.bloom.nbytes if self.bloom is not None else 0)
+
+    def word(self, word_id: int) -> str:
+        return self.word_blob[int(self.word_offsets[word_id]):int(self.word_offsets[word_id + 1])].decode('utf-8')
+
+    def word_id(self, word: str):
+        """
+        Return the integer ID of a word, or None when the word is not in the vocabulary.
+        """
+        key = word.encode('utf-8')
+        lo, hi = 0, self.vocab_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word_blob[int(self.word_offsets[mid]):int(self.word_offsets[mid + 1])] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.vocab_size and self.word(lo) == word:
+            return lo
+        return None
+
+    def __contains__(self, word: str) -> bool:
+        """
+        Vocabulary check usable as the n_grams argument of non_word_checking.spell_checker.
+        """
+        if self.bloom is not None:
+            return word in self.bloom
+        word_id = self.word_id(word)
+        return word_id is not None and bool(self.known[word_id])
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        The vocabulary words, like the keys of a unigram table.
+        """
+        return (self.word(i) for i in np.flatnonzero(self.known).tolist())
+
+    def __getitem__(self, word: str) -> float:
+        """
+        Unigram probability of a vocabulary word. It stands in for the counts of a unigram table whose total is 1,
+        e.g. in non_word_checking.top_k_suggestions.
+        """
+        return math.exp(self.log_unigram_probability(word))
+
+    def ids(self, words: List[str]) -> np.ndarray:
+        # -1 stands for a word outside the vocabulary
+        return np.array([-1 if i is None else i for i in map(self.word_id, words)], dtype=np.int64)
+
+    def log_unigram_probability(self, word: str) -> float:
+        word_id = self.word_id(word)
+        if word_id is None or not self.known[word_id]:
+            return -math.inf
+        return float(self.unigram_codebook[self.unigram_codes[word_id]])
+
+    def _log_row_probabilities(self, prev_id: int, word_ids: np.ndarray) -> np.ndarray:
+        """
+        log P(w | prev_id) for every w in word_ids, from one binary search over the row of prev_id.
+        """
+        if prev_id < 0:
+            return np.full(len(word_ids), -self.log_unknown_denominator)
+        result = np.full(len(word_ids), self.unseen_codebook[self.unseen_codes[prev_id]])
+        start, end = int(self.row_offsets[prev_id]), int(self.row_offsets[prev_id + 1])
+        row = self.successors[start:end]
+        if len(row) > 0:
+            pos = np.minimum(np.searchsorted(row, word_ids), len(row) - 1)
+            found = (row[pos] == word_ids) & (word_ids >= 0)
+            result[found] = self.bigram_codebook[self.bigram_codes[start + pos[found]]]
+        return result
+
+    def log_candidate_probabilities(self, prev_word: str, words: List[str]) -> np.ndarray:
+        """
+        log P(word | prev_word) for many candidate words.
+        """
+        return self._log_row_probabilities(self.ids([prev_word])[0], self.ids(words))
+
+    def log_successor_probabilities(self, prev_words: List[str], word: str) -> np.ndarray:
+        """
+        log P(word | p) for many candidate histories p.
+        """
+        word_ids = self.ids([word])
+        return np.array([self._log_row_probabilities(p, word_ids)[0] for p in self.ids(prev_words).tolist()])
+
+    def log_sentence_probability(self, sent) -> float:
+        words = sent.split() if isinstance(sent, str) else sent
+        ids = self.ids(words).tolist()
+        return float(sum(self._log_row_probabilities(p, np.array([w]))[0] for p, w in zip(ids, ids[1:])))
+
+    def score_variants(self, words: List[str], position: int, candidates: List[str]):
+        """
+        Same contract as CompactBigramModel.score_variants: the log score of the sentence and an array of the
+        log scores of the variants with words[position] replaced by each candidate.
+        """
+        base = self.log_sentence_probability(words)
+        delta = np.zeros(len(candidates))
+        if position > 0:
+            delta += self.log_candidate_probabilities(words[position - 1], candidates)
+            delta -= self.log_candidate_probabilities(words[position - 1], [words[position]])[0]
+        if position + 1 < len(words):
+            delta += self.log_successor_probabilities(candidates, words[position + 1])
+            delta -= self.log_successor_probabilities([words[position]], words[position + 1])[0]
+        return base, base + delta
+
+
+"""
+Part 4: Memory and Accuracy Report
+"""
+def dict_memory(*dicts: Dict) -> int:
+    """
+    Bytes held by dictionaries of counts: the dicts, their keys (with the strings inside tuple keys) and values.
+    Objects shared between entries, such as words or small ints, are counted once.
+    """
+    seen = set()
+    total = 0
+
+    def add(obj):
+        nonlocal total
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+            if isinstance(obj, tuple):
+                for item in obj:
+                    add(item)
+
+    for d in dicts:
+        add(d)
+        for key, value in d.items():
+            add(key)
+            add(value)
+    return total
+
+
+def lookup_time(vocabulary, words: List[str], repeat: int = 5) -> float:
+    """
+    Mean seconds of one 'word in vocabulary' check over words, from the fastest of repeat rounds.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for word in words:
+            word in vocabulary
+        best = min(best, time.perf_counter() - start)
+    return best / max(1, len(words))
+
+
+def _flagged(model, windows: List[List[str]], confusion: Dict[str, List[str]]) -> List[Tuple[str, ...]]:
+    """
+    Real-word verdict of every two-word window: the candidates scoring higher than the checked word.
+    """
+    verdicts = []
+    for words in windows:
+        candidates = confusion[words[-1]]
+        if not candidates:
+            verdicts.append(())
+            continue
+        score, scores = model.score_variants(words, 1, candidates)
+        verdicts.append(tuple(c for c, s in zip(candidates, scores) if s > score))
+    return verdicts
+
+
+def compare_models(freq_dict_unigram: Dict, freq_dict_bigram: Dict, sentences: List[str], settings: List[Tuple],
+                   size: int = 1000, seed: int = 0) -> List[Dict]:
+    """
+    Build a compressed model for every (min_count, bits, bloom_error_rate) setting and measure it against the
+    full model on seeded workloads: corpus windows, the same windows with their last word swapped for a
+    confusable word (simulated real-word errors), one-edit typos and corpus sentences. Reported per setting:
+    size in bytes, agreement of the real-word verdicts with the full model, the share of simulated errors
+    still detected, the share of typos accepted as words, the mean latency of a vocabulary check (on the typos
+    and as many vocabulary words) and the mean absolute error of sentence log scores.
+    The first row describes the full model: the count dicts and, as compact_bytes, the CompactBigramModel arrays.
+    """
+    import benchmark
+
+    rng = random.Random(seed)
+    full = real_word_checking.CompactBigramModel.from_dicts(freq_dict_unigram, freq_dict_bigram)
+    index = candidate_index.DeletionIndex(freq_dict_unigram, 2, candidate_index.ALPHABET)
+
+    sample = [s.split() for s in rng.sample(sentences, min(size, len(sentences)))]
+    windows, errors = [], []
+    while len(windows) < size:
+        words = rng.choice(sentences).split()
+        if len(words) > 1:
+            i = rng.randrange(1, len(words))
+            windows.append(words[i - 1:i + 1])
+            swaps = candidate_index.confusion_set(index, words[i])
+            if swaps:
+                errors.append([words[i - 1], rng.choice(swaps)])
+    vocabulary = sorted(w for w in freq_dict_unigram if w)
+    typos = benchmark.typo_workload(vocabulary, size, 1, seed)
+    queries = typos + rng.sample(vocabulary, min(size, len(vocabulary)))
+    confusion = {w: candidate_index.confusion_set(index, w) for words in windows + errors for w in words[-1:]}
+
+    full_clean = _flagged(full, windows, confusion)
+    full_errors = _flagged(full, errors, confusion)
+    full_scores = np.array([full.log_sentence_probability(s) for s in sample])
+    compact_bytes = sum(a.nbytes for a in (full.unigram_counts, full.row_offsets, full.successors, full.counts))
+    rows = [{'model': 'full', 'bytes': dict_memory(freq_dict_unigram, freq_dict_bigram), 'compact_bytes': compact_bytes,
+             'bigrams': len(freq_dict_bigram), 'agreement': 1.0,
+             'detection': sum(map(bool, full_errors)) / max(1, len(errors)), 'false_words': 0.0,
+             'lookup_seconds': lookup_time(freq_dict_unigram, queries), 'log_error': 0.0}]
+
+    for min_count, bits, bloom_error_rate in settings:
+        model = CompressedBigramModel.build(freq_dict_unigram, freq_dict_bigram, min_count, bits, bloom_error_rate)
+        clean = _flagged(model, windows, confusion)
+        flagged_errors = _flagged(model, errors, confusion)
+        scores = np.array([model.log_sentence_probability(s) for s in sample])
+        rows.append({
+            'model': 'min_count=%d bits=%d bloom=%s' % (min_count, bits, bloom_error_rate or 'off'),
+            'bytes': model.nbytes,
+            'bigrams': len(model.successors),
+            'agreement': (sum(a == b for a, b in zip(clean, full_clean)) + sum(a == b for a, b in zip(flagged_errors, full_errors)))
+                         / (len(windows) + len(errors)),
+            'detection': sum(map(bool, flagged_errors)) / max(1, len(errors)),
+            'false_words': sum(t in model for t in typos) / len(typos),
+            'lookup_seconds': lookup_time(model, queries),
+            'log_error': float(np.mean(np.abs(scores - full_scores))),
+        })
+    return rows
+
+
+def print_report(rows: List[Dict]):
+    print('%-34s %10s %9s %9s %9s %9s %11s %10s %9s' % ('model', 'KB', 'x full', 'bigrams', 'agree', 'detect', 'false word',
+                                                       'lookup us', '|dlogP|'))
+    full_bytes = rows[0]['bytes']
+    for row in rows:
+        print('%-34s %10.1f %9.3f %9d %8.2f%% %8.2f%% %10.2f%% %10.2f %9.4f' % (
+            row['model'], row['bytes'] / 1024, row['bytes'] / full_bytes, row['bigrams'], 100 * row['agreement'],
+            100 * row['detection'], 100 * row['false_words'], row['lookup_seconds'] * 1e6, row['log_error']))
+    print('full model as CompactBigramModel arrays: %.1f KB' % (rows[0]['compact_bytes'] / 1024))
+
+
+def engine_memory(file_dir: str, snapshot_path: str, **options) -> Dict:
+    """
+    Memory held by a loaded SpellCheckEngine with the given options: the bytes it allocated while loading,
+    traced with tracemalloc (NumPy arrays included), and the size of the memory-mapped snapshot the full model
+    reads from, whose pages forked workers share. The engine is loaded once beforehand, so that the measured load
+    reads its files instead of building them.
+    """
+    from spell_engine import SpellCheckEngine
+
+    SpellCheckEngine(file_dir, snapshot_path, **options).check('the')
+    tracemalloc.start()
+    engine = SpellCheckEngine(file_dir, snapshot_path, **options)
+    engine.check('the')
+    engine.check_context('of the')
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'allocated': allocated, 'mapped': os.path.getsize(snapshot_path) if engine.model == 'full' else 0}
+
+
+def print_engine_report(file_dir: str, snapshot_path: str, compressed_path: str = None):
+    print('%-34s %13s %10s' % ('engine', 'allocated KB', 'mapped KB'))
+    for name, options in (('full, deletion index', {}), ('full, trie', {'candidate_backend': 'trie'}),
+                          ('compressed, trie', {'model': 'compressed', 'compressed_path': compressed_path})):
+        memory = engine_memory(file_dir, snapshot_path, **options)
+        print('%-34s %13.1f %10.1f' % (name, memory['allocated'] / 1024, memory['mapped'] / 1024))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build compressed language models and report their memory and accuracy '
+                                                 'against the full model.')
+    parser.add_argument('--corpus', default='./data/*.txt')
+    parser.add_argument('--min-count', type=int, nargs='+', default=[1, 2, 3], help='bigram count thresholds to compare')
+    parser.add_argument('--bits', type=int, nargs='+', default=[8, 16], help='quantization bits to compare')
+    parser.add_argument('--bloom-error-rate', type=float, default=0.01, help='Bloom filter false positive rate; 0 for none')
+    parser.add_argument('--size', type=int, default=1000, help='windows, typos and sentences per measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save the model built with the first --min-count and --bits to this file, '
+                                         'which the compressed engine of the engine report then uses')
+    parser.add_argument('--snapshot', default='./data/model.snapshot', help='snapshot of the engines in the engine report')
+    args = parser.parse_args()
+
+    counts = model_builder.build_model(args.corpus, keep_sentences=True)
+    (freq_dict_unigram, freq_dict_bigram), sentences = counts.tables(), counts.sentences
+    bloom_error_rate = args.bloom_error_rate or None
+    settings = [(m, b, bloom_error_rate) for m in args.min_count for b in args.bits]
+    print_report(compare_models(freq_dict_unigram, freq_dict_bigram, sentences, settings, args.size, args.seed))
+    if args.output:
+        CompressedBigramModel.build(freq_dict_unigram, freq_dict_bigram, args.min_count[0], args.bits[0],
+                                    bloom_error_rate).save(args.output)
+    print()
+    print_engine_report(args.corpus, args.snapshot, args.output)
@@ -5,20 +5,192 @@ References:
     https://github.com/NethumL/pyqt-spellcheck
 """
 
-import re
+import time
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat
+from typing import List, Tuple
 
+from PyQt5 import sip
+from PyQt5.QtCore import QCoreApplication, QObject, Qt, QThread, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QSyntaxHighlighter, QTextBlock, QTextBlockUserData, QTextCharFormat, QTextDocument
+
+from lru_cache import LRUCache
+import metrics
+from non_word_checking import wordRegEx
 from spellcheckwrapper import SpellCheckWrapper
 
 
-class SpellCheckHighlighter(QSyntaxHighlighter):
-    wordRegEx = re.compile(r"\b([A-Za-z]{1,})\b")
+# Kinds of errors reported for a block
+MISSPELLED = 0
+MISS_CONTEXT = 1
 
-    def highlightBlock(self, text: str) -> None:
-        if not hasattr(self, "speller"):
+
+def find_errors(speller: SpellCheckWrapper, text: str) -> List[Tuple[int, int, int]]:
+    """
+    Check every word of a block and return (start, length, kind) for each error.
+    Only correctly spelled words are checked against their preceding words.
+    """
+    history = getattr(speller, 'context_order', 2) - 1
+    words = [(m.start(), m.end(), m.group()) for m in wordRegEx.finditer(text)]
+
+    errors = []
+    for count, (start, end, word) in enumerate(words):
+        if not speller.check(word):
+            errors.append((start, end - start, MISSPELLED))
+
+        elif count != 0:
+            if not speller.check_context(' '.join(w for _, _, w in words[max(0, count - history):count + 1])):
+                errors.append((start, end - start, MISS_CONTEXT))
+
+    return errors
+
+
+class BlockChecker:
+    """
+    Cached, incremental version of find_errors.
+    Whole blocks are cached by their content, single words and context windows by their verdict.
+    A window is a word with the words before it, as many as the speller's context model looks at
+    (one for the bigram model). When the previous text of a block is known, only the words inside the
+    changed span and the words whose window reaches into it are evaluated again; the verdicts of the
+    other words around the span are reused. The windows of the first words of a block reach into the
+    blocks before it when their last words are passed as history.
+    """
+    def __init__(self, speller: SpellCheckWrapper, max_blocks: int = 1024, max_verdicts: int = 65536):
+        self.speller = speller
+        self.history = getattr(speller, 'context_order', 2) - 1
+        # Block text -> (words, kinds, errors)
+        self.blocks = LRUCache(max_blocks)
+        # Word -> check verdict, window of words -> check_context verdict
+        self.words = LRUCache(max_verdicts)
+        self.pairs = LRUCache(max_verdicts)
+        # Number of check and check_context calls made on the speller
+        self.speller_calls = 0
+        # Verdicts are dropped whenever the speller's model is updated
+        self.generation = getattr(speller, 'generation', 0)
+
+    def check(self, text: str, previous_text: str = None, history: Tuple[str, ...] = ()) -> List[Tuple[int, int, int]]:
+        """
+        Errors of a block. history holds the last words of the blocks before it, which the windows of the
+        first words of the block reach into; without it those windows stop at the start of the block.
+        """
+        generation = getattr(self.speller, 'generation', 0)
+        if generation != self.generation:
+            self.blocks.clear()
+            self.words.clear()
+            self.pairs.clear()
+            self.generation = generation
+
+        calls = self.speller_calls
+        cached = self.blocks.get(text)
+        if cached is None:
+            cached = self.checkBlock(text, previous_text)
+            self.blocks.put(text, cached)
+        words, kinds, spans = cached
+
+        if history and self.history:
+            kinds = list(kinds)
+            for i in range(min(self.history, len(words))):
+                if kinds[i] != MISSPELLED:
+                    kinds[i] = self.verdict(tuple(history[-(self.history - i):]) + tuple(words[:i]), words[i])
+
+        if metrics.enabled:
+            metrics.observe('highlighter_speller_calls_per_block', self.speller_calls - calls)
+            metrics.counter('highlighter_speller_calls_total').inc(self.speller_calls - calls)
+        return [(start, end - start, kind) for (start, end), kind in zip(spans, kinds) if kind is not None]
+
+    def checkBlock(self, text: str, previous_text: str = None):
+        """
+        Words, verdicts and (start, end) spans of the words of a block, without the blocks before it.
+        """
+        matches = [(m.start(), m.end(), m.group()) for m in wordRegEx.finditer(text)]
+        words = [word for _, _, word in matches]
+        kinds = [None] * len(words)
+        dirty = [True] * len(words)
+
+        previous = self.blocks.get(previous_text) if previous_text is not None else None
+        if previous is not None:
+            old_words, old_kinds, _ = previous
+            limit = min(len(old_words), len(words))
+            prefix = 0
+            while prefix < limit and old_words[prefix] == words[prefix]:
+                prefix += 1
+            suffix = 0
+            while suffix < limit - prefix and old_words[-1 - suffix] == words[-1 - suffix]:
+                suffix += 1
+
+            for i in range(prefix):
+                kinds[i], dirty[i] = old_kinds[i], False
+            # The first words after the changed span have a new window, so they are checked again
+            for k in range(suffix - self.history):
+                kinds[-1 - k], dirty[-1 - k] = old_kinds[-1 - k], False
+
+        for i, word in enumerate(words):
+            if dirty[i]:
+                kinds[i] = self.verdict(tuple(words[max(0, i - self.history):i]), word)
+
+        return words, kinds, [(start, end) for start, end, _ in matches]
+
+    def verdict(self, history: Tuple[str, ...], word: str):
+        correct = self.words.get(word)
+        if correct is None:
+            correct = self.speller.check(word)
+            self.speller_calls += 1
+            self.words.put(word, correct)
+        if not correct:
+            return MISSPELLED
+        if len(history) == 0:
+            return None
+
+        window = history + (word,)
+        correct = self.pairs.get(window)
+        if correct is None:
+            correct = self.speller.check_context(' '.join(window))
+            self.speller_calls += 1
+            self.pairs.put(window, correct)
+        return None if correct else MISS_CONTEXT
+
+
+class BlockSpellData(QTextBlockUserData):
+    """
+    Remembers the text a block had when it was last checked, the last words before it, its errors and the
+    speller generation they were found with, so the block can be formatted again without checking it.
+    """
+    def __init__(self, text: str, errors: List[Tuple[int, int, int]] = (), generation: int = 0, history: Tuple[str, ...] = ()):
+        super().__init__()
+        self.text = text
+        self.errors = errors
+        self.generation = generation
+        self.history = history
+
+
+class SpellCheckWorker(QObject):
+    """
+    Checks blocks on a background thread. Requests whose revision is no longer the latest one
+    for their block are skipped, so only the newest text of a block is ever checked.
+    """
+    blockChecked = pyqtSignal(int, int, str, object)
+
+    def __init__(self, checker: BlockChecker, latest: dict):
+        super().__init__()
+        self.checker = checker
+        # Block number -> (revision, text, history) of the newest request, owned by the highlighter
+        self.latest = latest
+
+    @pyqtSlot(int, int, str, object, object)
+    def checkBlock(self, blockNumber: int, revision: int, text: str, previousText, history):
+        if self.latest.get(blockNumber, (None,))[0] != revision:
             return
+        errors = self.checker.check(text, previousText, history)
+        self.blockChecked.emit(blockNumber, revision, text, errors)
+
+
+class SpellCheckHighlighter(QSyntaxHighlighter):
+    wordRegEx = wordRegEx
+    checkRequested = pyqtSignal(int, int, str, object, object)
+    # Blocks scanned by idle-time checking so far and blocks in the document
+    checkingProgress = pyqtSignal(int, int)
+
+    def __init__(self, *args):
+        super().__init__(*args)
 
         self.misspelledFormat = QTextCharFormat()
         self.misspelledFormat.setUnderlineStyle(QTextCharFormat.SpellCheckUnderline)
@@ -28,28 +200,286 @@ class SpellCheckHighlighter(QSyntaxHighlighter):
         self.missContextFormat.setUnderlineStyle(QTextCharFormat.SpellCheckUnderline)
         self.missContextFormat.setUnderlineColor(Qt.blue)
 
-        temp = []
-        for word_object in self.wordRegEx.finditer(text):
-            temp.append(word_object.group())
-
-        count = 0
-        for word_object in self.wordRegEx.finditer(text):
-            if not self.speller.check(word_object.group()):
-                self.setFormat(
-                    word_object.start(),
-                    word_object.end() - word_object.start(),
-                    self.misspelledFormat,
-                )
-
-            elif count != 0:
-                if not self.speller.check_context(temp[count - 1] + ' ' + temp[count]):
-                    self.setFormat(
-                        word_object.start(),
-                        word_object.end() - word_object.start(),
-                        self.missContextFormat,
-                    )
-
-            count += 1
+        # Asynchronous checking state
+        self.asynchronous = False
+        self.workerThread = None
+        self.worker = None
+        self.revision = 0
+        self.pending = {}
+        self.results = LRUCache(1024)
+
+        # Optional word_index.DocumentWordIndex of the document, giving the first words of a block the
+        # words before it as context
+        self.wordIndex = None
+
+        # Deferred checking state: only the visible blocks (and margin blocks around them) are checked when
+        # they are highlighted, the others in idle time, at most idleBudget seconds per event loop iteration
+        self.deferred = False
+        self.visibleMargin = 20
+        self.idleBudget = 0.01
+        # Idle-time checking waits until no edit was made for this many seconds
+        self.typingPause = 0.3
+        # Requests queued to the worker thread at a time by idle-time checking
+        self.maxInFlight = 16
+        self.visibleFirst = 0
+        self.priorityFirst, self.priorityLast = 0, -1
+        self.scanPosition = 0
+        self.rescan = False
+        self.forcing = False
+        self.lastEdit = 0.0
+        self.idleTimer = QTimer(self)
+        self.idleTimer.setSingleShot(True)
+        self.idleTimer.timeout.connect(self.checkIdleBlocks)
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stopWorker)
+
+        if self.document() is not None:
+            self.document().contentsChange.connect(self.onContentsChange)
+            self.document().destroyed.connect(self.stopWorker)
+
+    def highlightBlock(self, text: str) -> None:
+        if not hasattr(self, "speller"):
+            return
+
+        generation = getattr(self.speller, 'generation', 0)
+        block = self.currentBlock()
+        history = self.blockHistory(block)
+        if self.wordIndex is not None:
+            # A changed state makes Qt highlight the next block too, whose first words use these as context
+            end = block.position() + block.length() - 1
+            self.setCurrentBlockState(hash(tuple(self.wordIndex.previousWords(end, self.checker.history))) & 0x3fffffff)
+
+        data = self.currentBlockUserData()
+        if isinstance(data, BlockSpellData) and data.text == text and data.generation == generation and data.history == history:
+            self.applyErrors(data.errors)
+            return
+        previousText = data.text if isinstance(data, BlockSpellData) else None
+
+        blockNumber = block.blockNumber()
+        if self.workerThread is not None:
+            result = self.results.get(blockNumber)
+            if result is not None and result[0] == text and result[2] == generation and result[3] == history:
+                self.applyErrors(result[1])
+                self.setCurrentBlockUserData(BlockSpellData(text, result[1], generation, history))
+                return
+
+        if self.deferred and not self.forcing and not self.priorityFirst <= blockNumber <= self.priorityLast:
+            # Left unformatted until checkIdleBlocks reaches it
+            if blockNumber < self.scanPosition:
+                self.rescan = True
+            if not self.idleTimer.isActive():
+                self.idleTimer.start(0)
+            return
+
+        if self.workerThread is None:
+            errors = self.checker.check(text, previousText, history)
+            self.applyErrors(errors)
+            self.setCurrentBlockUserData(BlockSpellData(text, errors, generation, history))
+        elif self.pending.get(blockNumber, (None,))[1:] != (text, history):
+            # A newer text supersedes any request still queued for this block
+            self.revision += 1
+            self.pending[blockNumber] = (self.revision, text, history)
+            self.checkRequested.emit(blockNumber, self.revision, text, previousText, history)
+
+    def blockHistory(self, block: QTextBlock) -> Tuple[str, ...]:
+        """
+        The words before a block that the context model looks at, or () without a word index.
+        """
+        if self.wordIndex is None or not hasattr(self, 'checker'):
+            return ()
+        return tuple(self.wordIndex.previousWords(block.position(), self.checker.history))
+
+    def setWordIndex(self, wordIndex):
+        self.wordIndex = wordIndex
+        if hasattr(self, "speller"):
+            self.rehighlight()
+
+    def onContentsChange(self, position: int, charsRemoved: int, charsAdded: int):
+        # Formatting a block from checkIdleBlocks or onBlockChecked is reported as a change too, but it is no edit
+        if self.forcing:
+            return
+        # Speller calls per keystroke: highlighter_speller_calls_total / highlighter_edits_total
+        if metrics.enabled:
+            metrics.counter('highlighter_edits_total').inc()
+        self.lastEdit = time.monotonic()
+
+    def setDeferred(self, enabled: bool):
+        """
+        Check only the visible blocks right away and the rest of the document in idle time, so opening or pasting
+        a large document does not freeze the editor. The editor reports its visible blocks with setVisibleBlocks.
+        """
+        if enabled == self.deferred:
+            return
+        self.deferred = enabled
+        self.scanPosition = 0
+        self.rescan = False
+        if enabled:
+            self.idleTimer.start(0)
+        else:
+            self.idleTimer.stop()
+            # Check the blocks left unformatted
+            if hasattr(self, "speller"):
+                self.rehighlight()
+
+    def setVisibleBlocks(self, first: int, last: int):
+        self.visibleFirst = first
+        self.priorityFirst = max(0, first - self.visibleMargin)
+        self.priorityLast = last + self.visibleMargin
+        if self.deferred and not self.idleTimer.isActive():
+            self.idleTimer.start(0)
+
+    def needsCheck(self, block: QTextBlock) -> bool:
+        data = block.userData()
+        text = block.text()
+        history = self.blockHistory(block)
+        if (isinstance(data, BlockSpellData) and data.text == text and data.history == history
+                and data.generation == getattr(self.speller, 'generation', 0)):
+            return False
+        return self.workerThread is None or self.pending.get(block.blockNumber(), (None,))[1:] != (text, history)
+
+    def checkBlockNow(self, block: QTextBlock) -> bool:
+        """
+        Check and format one block, or with a worker thread queue it; False when too many requests are queued.
+        """
+        if self.workerThread is not None and len(self.pending) >= self.maxInFlight:
+            return False
+        self.forcing = True
+        try:
+            self.rehighlightBlock(block)
+        finally:
+            self.forcing = False
+        return True
+
+    @pyqtSlot()
+    def checkIdleBlocks(self):
+        """
+        One idle-time step: check the visible blocks and those below them first, then those above, then continue
+        the scan of the document where the previous step stopped, until idleBudget seconds have passed.
+        """
+        if not self.deferred or not hasattr(self, "speller") or self.document() is None:
+            return
+        wait = self.lastEdit + self.typingPause - time.monotonic()
+        if wait > 0:
+            self.idleTimer.start(int(wait * 1000) + 1)
+            return
+
+        deadline = time.perf_counter() + self.idleBudget
+        document = self.document()
+        for first, last in ((self.visibleFirst, self.priorityLast), (self.priorityFirst, self.visibleFirst - 1)):
+            block = document.findBlockByNumber(first)
+            while block.isValid() and block.blockNumber() <= last:
+                if self.needsCheck(block) and not self.checkBlockNow(block):
+                    # The worker thread restarts the scan once it returns a result
+                    return
+                if time.perf_counter() > deadline:
+                    self.idleTimer.start(0)
+                    return
+                block = block.next()
+
+        block = document.findBlockByNumber(self.scanPosition)
+        while block.isValid():
+            if self.needsCheck(block) and not self.checkBlockNow(block):
+                self.checkingProgress.emit(self.scanPosition, document.blockCount())
+                return
+            block = block.next()
+            self.scanPosition += 1
+            if time.perf_counter() > deadline:
+                self.checkingProgress.emit(self.scanPosition, document.blockCount())
+                self.idleTimer.start(0)
+                return
+
+        if self.rescan:
+            # Blocks behind the scan position were deferred meanwhile
+            self.scanPosition = 0
+            self.rescan = False
+            self.idleTimer.start(0)
+            return
+        if self.pending:
+            # Not done until the worker thread returns the queued blocks; onBlockChecked runs this step again
+            return
+        self.checkingProgress.emit(document.blockCount(), document.blockCount())
+
+    def applyErrors(self, errors: List[Tuple[int, int, int]]):
+        for start, length, kind in errors:
+            self.setFormat(start, length, self.misspelledFormat if kind == MISSPELLED else self.missContextFormat)
 
     def setSpeller(self, speller: SpellCheckWrapper):
         self.speller = speller
+        self.checker = BlockChecker(speller)
+        self.restartWorker()
+
+    def setAsynchronous(self, enabled: bool):
+        """
+        Check blocks on a worker thread instead of the GUI thread. Results are applied by re-highlighting
+        only the block they belong to, once they arrive.
+        """
+        if enabled == self.asynchronous:
+            return
+        self.asynchronous = enabled
+        self.restartWorker()
+        # Requests queued to a stopped worker are lost, so check every block again
+        if hasattr(self, "speller"):
+            self.rehighlight()
+
+    def restartWorker(self):
+        self.stopWorker()
+        if not self.asynchronous or not hasattr(self, "speller"):
+            return
+
+        self.workerThread = QThread()
+        self.worker = SpellCheckWorker(self.checker, self.pending)
+        self.worker.moveToThread(self.workerThread)
+        self.checkRequested.connect(self.worker.checkBlock)
+        self.worker.blockChecked.connect(self.onBlockChecked)
+        # Qt aborts when a running thread is deleted, and the Python objects may be released before the thread
+        # has stopped, e.g. when the editor is destroyed. So the thread and the worker are owned by Qt and
+        # delete themselves once the thread has stopped, and destroying the highlighter stops the thread
+        sip.transferto(self.workerThread, None)
+        sip.transferto(self.worker, None)
+        self.workerThread.finished.connect(self.worker.deleteLater)
+        self.workerThread.finished.connect(self.workerThread.deleteLater)
+        self.destroyed.connect(self.workerThread.quit)
+        self.workerThread.start()
+
+    def stopWorker(self):
+        if self.workerThread is None:
+            return
+        self.checkRequested.disconnect(self.worker.checkBlock)
+        self.destroyed.disconnect(self.workerThread.quit)
+        self.workerThread.quit()
+        self.workerThread.wait()
+        self.workerThread = None
+        self.worker = None
+        self.pending.clear()
+        self.results.clear()
+
+    def setDocument(self, document: QTextDocument):
+        # Queued requests refer to the blocks of the old document
+        self.stopWorker()
+        if self.document() is not None:
+            self.document().contentsChange.disconnect(self.onContentsChange)
+            self.document().destroyed.disconnect(self.stopWorker)
+        super().setDocument(document)
+        if document is not None:
+            document.contentsChange.connect(self.onContentsChange)
+            document.destroyed.connect(self.stopWorker)
+        self.restartWorker()
+
+    @pyqtSlot(int, int, str, object)
+    def onBlockChecked(self, blockNumber: int, revision: int, text: str, errors: list):
+        if self.pending.get(blockNumber, (None,))[0] != revision:
+            return
+        history = self.pending.pop(blockNumber)[2]
+        self.results.put(blockNumber, (text, errors, self.checker.generation, history))
+
+        block = self.document().findBlockByNumber(blockNumber)
+        if block.isValid() and block.text() == text:
+            self.forcing = True
+            try:
+                self.rehighlightBlock(block)
+            finally:
+                self.forcing = False
+        if self.deferred and not self.idleTimer.isActive():
+            self.idleTimer.start(0)
@@ -0,0 +1,51 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Size-limited mapping that evicts the least recently used entry first and counts hits and misses.
+    It is safe to share between the GUI thread and the highlighter's worker thread.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -30,8 +30,18 @@ class Ui_MainWindow(QMainWindow):
         self.centralWidget.setLayout(self.layout)
 
         self.textEdit = SpellTextEdit(self.speller, self.centralWidget)
+        self.textEdit.highlighter.setAsynchronous(True)
+        # Large documents are checked from the visible part outwards, in idle time
+        self.textEdit.highlighter.setDeferred(True)
+        self.textEdit.highlighter.checkingProgress.connect(self.showCheckingProgress)
         self.layout.addWidget(self.textEdit)
 
+    def showCheckingProgress(self, checked: int, total: int):
+        if checked < total:
+            self.statusBar().showMessage('Checking: %d%%' % (100 * checked // total))
+        else:
+            self.statusBar().clearMessage()
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,203 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import os
+import time
+import bisect
+import weakref
+import threading
+import functools
+
+from typing import Callable, Dict, Sequence
+
+
+# Upper bounds of the histogram buckets, in seconds for timings and in items for sizes
+TIME_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# Instrumentation is off unless enabled here or with SPELLCHECK_METRICS=1
+enabled = os.environ.get('SPELLCHECK_METRICS', '') not in ('', '0')
+
+
+"""
+Part 1: Metric Types
+"""
+class Histogram:
+    """
+    Counts observations per bucket, with their sum, like a Prometheus histogram.
+    """
+    def __init__(self, name: str, help: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # One extra bucket for observations above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        return {'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], counts)),
+                'sum': total, 'count': count, 'mean': total / count if count else 0.0}
+
+    def prometheus(self) -> str:
+        lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            cumulative = 0
+            for bound, count in zip([repr(float(b)) for b in self.buckets] + ['+Inf'], self.counts):
+                cumulative += count
+                lines.append('%s_bucket{le="%s"} %d' % (self.name, bound, cumulative))
+            lines.append('%s_sum %r' % (self.name, self.sum))
+            lines.append('%s_count %d' % (self.name, self.count))
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+    def prometheus(self) -> str:
+        return '# HELP %s %s\n# TYPE %s counter\n%s %d' % (self.name, self.help, self.name, self.name, self.value)
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+
+"""
+Part 2: Registry
+"""
+# Metric name -> Histogram or Counter
+registry: Dict = {}
+_registry_lock = threading.Lock()
+# Weak references to bound methods returning {gauge name: value}, such as SpellCheckEngine.cache_info
+_collectors = []
+
+
+def histogram(name: str, help: str = '', buckets: Sequence[float] = TIME_BUCKETS) -> Histogram:
+    with _registry_lock:
+        if name not in registry:
+            registry[name] = Histogram(name, help, buckets)
+        return registry[name]
+
+
+def counter(name: str, help: str = '') -> Counter:
+    with _registry_lock:
+        if name not in registry:
+            registry[name] = Counter(name, help)
+        return registry[name]
+
+
+def observe(name: str, value: float, buckets: Sequence[float] = SIZE_BUCKETS):
+    """
+    Record a value; callers check metrics.enabled first so disabled instrumentation costs one attribute lookup.
+    """
+    histogram(name, buckets=buckets).observe(value)
+
+
+def register_collector(method: Callable):
+    """
+    Add a bound method whose result is included in every snapshot, for as long as its object is alive.
+    """
+    _collectors.append(weakref.WeakMethod(method))
+
+
+def timed(name: str, help: str = ''):
+    """
+    Decorator recording the duration of every call in the histogram name, while metrics are enabled.
+    """
+    def decorator(function):
+        metric = histogram(name, help or 'Duration of %s in seconds' % function.__qualname__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    for metric in list(registry.values()):
+        metric.reset()
+
+
+"""
+Part 3: Pull API
+"""
+def _collect() -> Dict:
+    gauges = {}
+    for reference in list(_collectors):
+        method = reference()
+        if method is None:
+            _collectors.remove(reference)
+            continue
+        for key, value in method().items():
+            gauges[key] = gauges.get(key, 0) + value
+    return gauges
+
+
+def snapshot() -> Dict:
+    """
+    Current value of every metric: histograms as dicts of bucket counts, sum, count and mean,
+    counters as ints, and collector gauges such as cache hits, misses and sizes.
+    """
+    result = {name: metric.snapshot() for name, metric in sorted(registry.items())}
+    result.update(_collect())
+    return result
+
+
+def prometheus_text() -> str:
+    """
+    Every metric in the Prometheus text exposition format.
+    """
+    parts = [metric.prometheus() for _, metric in sorted(registry.items())]
+    for key, value in sorted(_collect().items()):
+        parts.append('# TYPE %s gauge\n%s %r' % (key, key, value))
+    return '\n'.join(parts) + '\n'
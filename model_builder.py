@@ -0,0 +1,127 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import time
+import argparse
+import tracemalloc
+
+from typing import Dict, Iterable, List, Tuple
+from collections import Counter
+
+import non_word_checking
+import real_word_checking
+
+
+START_SENTENCE = '<SOS>'
+END_SENTENCE = '<EOS>'
+
+
+"""
+Part 1: Single-pass Counting
+"""
+class ModelCounts:
+    """
+    Tables of a language model, filled in one pass over (tokens, sentences) batches such as those of
+    non_word_checking.iter_corpus. Every batch is counted and dropped, so the corpus is never held in memory.
+    unigrams: count of every token, counted once (calling non_word_checking.language_model and then
+        real_word_checking.language_model on one dictionary counts every token twice)
+    bigrams: count of every pair of adjacent words inside a sentence, sentence markers included,
+        equal to real_word_checking.bigramLangModel
+    boundaries: how many sentences start and end, keyed by the sentence markers, which are not unigrams
+    sentences: the sentences themselves, kept only when asked for (the higher-order models are fitted on them)
+    """
+    def __init__(self, keep_sentences: bool = False):
+        self.unigrams = Counter()
+        self.bigrams = Counter()
+        self.boundaries = {START_SENTENCE: 0, END_SENTENCE: 0}
+        self.sentences = [] if keep_sentences else None
+        self.token_count = 0
+
+    def add(self, tokens: List[str], sentences: List[str]):
+        self.unigrams.update(tokens)
+        self.token_count += len(tokens)
+        for sentence in sentences:
+            words = sentence.split()
+            self.bigrams.update(zip(words, words[1:]))
+            self.boundaries[START_SENTENCE] += words[0] == START_SENTENCE
+            self.boundaries[END_SENTENCE] += words[-1] == END_SENTENCE
+        if self.sentences is not None:
+            self.sentences.extend(sentences)
+
+    def tables(self) -> Tuple[Dict, Dict]:
+        """
+        The unigram and bigram dictionaries, in the format of real_word_checking.language_model.
+        """
+        unigrams = dict(self.unigrams)
+        unigrams.pop(START_SENTENCE, None)
+        unigrams.pop(END_SENTENCE, None)
+        return unigrams, dict(self.bigrams)
+
+
+def count_batches(batches: Iterable[Tuple[List[str], List[str]]], keep_sentences: bool = False) -> ModelCounts:
+    counts = ModelCounts(keep_sentences)
+    for tokens, sentences in batches:
+        counts.add(tokens, sentences)
+    return counts
+
+
+def build_model(file_dir: str, keep_sentences: bool = False) -> ModelCounts:
+    """
+    Count every file matched by file_dir in one streaming pass.
+    """
+    return count_batches(non_word_checking.iter_corpus(file_dir), keep_sentences)
+
+
+"""
+Part 2: Build Report
+"""
+def measure_build(build, trace_memory: bool = True) -> Dict:
+    """
+    Run a build function and report its wall time and, traced separately, its peak Python memory.
+    """
+    start = time.perf_counter()
+    build()
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'seconds': seconds, 'peak_memory_kb': peak / 1024 if peak is not None else None}
+
+
+def two_pass_build(file_dir: str) -> Tuple[Dict, Dict]:
+    """
+    The former build: tokens and sentences of the whole corpus in lists, then one pass over the tokens per
+    unigram model and one over the sentences, sharing one unigram dictionary.
+    """
+    tokens, sentences = non_word_checking.get_tokens(file_dir)
+    freq_dict_unigram = non_word_checking.language_model(tokens, START_SENTENCE, END_SENTENCE, {})
+    return real_word_checking.language_model(tokens, sentences, START_SENTENCE, END_SENTENCE, freq_dict_unigram, {})
+
+
+def compare_builds(file_dir: str, trace_memory: bool = True) -> Dict:
+    return {
+        'single_pass': measure_build(lambda: build_model(file_dir).tables(), trace_memory),
+        'two_pass': measure_build(lambda: two_pass_build(file_dir), trace_memory),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count the corpus in one pass and compare the build with the two-pass build.')
+    parser.add_argument('corpus', nargs='?', default='./data/*.txt')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run measuring peak memory')
+    args = parser.parse_args()
+
+    counts = build_model(args.corpus)
+    unigrams, bigrams = counts.tables()
+    print('%d tokens, %d sentences, %d unigram types, %d bigram types' % (
+        counts.token_count, counts.boundaries[START_SENTENCE], len(unigrams), len(bigrams)))
+    for name, result in compare_builds(args.corpus, not args.no_memory).items():
+        memory = '' if result['peak_memory_kb'] is None else '   peak %10.1f KB' % result['peak_memory_kb']
+        print('%-12s %8.3f s%s' % (name, result['seconds'], memory))
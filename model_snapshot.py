@@ -0,0 +1,306 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import os
+import sys
+import glob
+import mmap
+import struct
+
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections.abc import Mapping
+
+import numpy as np
+
+
+"""
+Part 1: Snapshot Layout
+"""
+# File layout (little endian, every array aligned on 8 bytes):
+#   header            MAGIC + (version, vocab_size, bigram_size, unigram_types, blob_size, log_sequence,
+#                     confusion_size) as uint64
+#   word_offsets      uint64[vocab_size + 1]   byte offsets of each word inside word_blob
+#   word_blob         utf-8 bytes of the vocabulary, sorted by their utf-8 encoding
+#   unigram_counts    int64[vocab_size]        0 for words that only occur inside bigrams (<SOS>, <EOS>)
+#   bigram_offsets    uint64[vocab_size + 1]   CSR row offsets, one row per previous word ID
+#   bigram_successors uint32[bigram_size]      sorted successor word IDs inside each row
+#   bigram_counts     int64[bigram_size]
+#   confusion_offsets uint64[vocab_size + 1]   CSR row offsets of the confusion set of each word ID
+#   confusion_ids     uint32[confusion_size]   sorted word IDs of the confusion sets (candidate_index.confusion_set)
+# log_sequence is the last entry of the update log (see model_updates) already counted in the snapshot.
+# Version 1 files have no log_sequence and are read as 0; version 1 and 2 files have no confusion sets.
+MAGIC = b'SPLMODEL'
+VERSION = 3
+HEADER = struct.Struct('<8s7Q')
+HEADERS = {1: struct.Struct('<8s5Q'), 2: struct.Struct('<8s6Q'), 3: HEADER}
+_PREFIX = struct.Struct('<8sQ')
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(vocab_size: int, bigram_size: int, blob_size: int, header_size: int = HEADER.size,
+            confusion_size: int = None) -> Dict:
+    """
+    Compute the byte offset of every section from the header counts.
+    The confusion sections are left out when confusion_size is None.
+    """
+    layout = {}
+    offset = header_size
+    sections = [('word_offsets', 8 * (vocab_size + 1)),
+                ('word_blob', blob_size),
+                ('unigram_counts', 8 * vocab_size),
+                ('bigram_offsets', 8 * (vocab_size + 1)),
+                ('bigram_successors', 4 * bigram_size),
+                ('bigram_counts', 8 * bigram_size)]
+    if confusion_size is not None:
+        sections += [('confusion_offsets', 8 * (vocab_size + 1)), ('confusion_ids', 4 * confusion_size)]
+    for name, size in sections:
+        offset = _align(offset)
+        layout[name] = offset
+        offset += size
+    layout['end'] = offset
+    return layout
+
+
+"""
+Part 2: Write Snapshot
+"""
+def write_snapshot(path: str, freq_dict_unigram: Dict, freq_dict_bigram: Dict, log_sequence: int = 0,
+                   confusion_sets: Dict[str, List[str]] = None):
+    """
+    Compile the unigram and bigram dictionaries into a snapshot file.
+    log_sequence records how many update log entries the dictionaries already include.
+    confusion_sets maps every word of freq_dict_unigram to its confusion set; they are computed with a
+    candidate_index.DeletionIndex over the vocabulary when not given.
+    The file is written next to its destination and moved into place, so readers never see a partial snapshot.
+    """
+    if confusion_sets is None:
+        import candidate_index
+        index = candidate_index.DeletionIndex(freq_dict_unigram, 2, candidate_index.ALPHABET)
+        confusion_sets = {w: candidate_index.confusion_set(index, w) for w in freq_dict_unigram}
+
+    words = set(freq_dict_unigram.keys())
+    for prev_word, word in freq_dict_bigram.keys():
+        words.add(prev_word)
+        words.add(word)
+    encoded = sorted(w.encode('utf-8') for w in words)
+    word_ids = {w.decode('utf-8'): i for i, w in enumerate(encoded)}
+
+    vocab_size = len(encoded)
+    word_offsets = np.zeros(vocab_size + 1, dtype='<u8')
+    word_offsets[1:] = np.cumsum([len(w) for w in encoded], dtype='<u8')
+    word_blob = b''.join(encoded)
+
+    unigram_counts = np.zeros(vocab_size, dtype='<i8')
+    for word, count in freq_dict_unigram.items():
+        unigram_counts[word_ids[word]] = count
+
+    pairs = sorted((word_ids[p], word_ids[w], c) for (p, w), c in freq_dict_bigram.items())
+    bigram_size = len(pairs)
+    prev_ids = np.fromiter((p for p, _, _ in pairs), dtype='<u8', count=bigram_size)
+    bigram_successors = np.fromiter((w for _, w, _ in pairs), dtype='<u4', count=bigram_size)
+    bigram_counts = np.fromiter((c for _, _, c in pairs), dtype='<i8', count=bigram_size)
+    bigram_offsets = np.zeros(vocab_size + 1, dtype='<u8')
+    bigram_offsets[1:] = np.cumsum(np.bincount(prev_ids.astype(np.intp), minlength=vocab_size), dtype='<u8')
+
+    rows = [[]] * vocab_size
+    for word, candidates in confusion_sets.items():
+        rows[word_ids[word]] = sorted(word_ids[c] for c in candidates)
+    confusion_size = sum(len(row) for row in rows)
+    confusion_offsets = np.zeros(vocab_size + 1, dtype='<u8')
+    confusion_offsets[1:] = np.cumsum([len(row) for row in rows], dtype='<u8')
+    confusion_ids = np.fromiter((i for row in rows for i in row), dtype='<u4', count=confusion_size)
+
+    unigram_types = sum(1 for c in freq_dict_unigram.values() if c > 0)
+    layout = _layout(vocab_size, bigram_size, len(word_blob), confusion_size=confusion_size)
+    sections = (('word_offsets', word_offsets.tobytes()),
+                ('word_blob', word_blob),
+                ('unigram_counts', unigram_counts.tobytes()),
+                ('bigram_offsets', bigram_offsets.tobytes()),
+                ('bigram_successors', bigram_successors.tobytes()),
+                ('bigram_counts', bigram_counts.tobytes()),
+                ('confusion_offsets', confusion_offsets.tobytes()),
+                ('confusion_ids', confusion_ids.tobytes()))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, vocab_size, bigram_size, unigram_types, len(word_blob), log_sequence,
+                               confusion_size))
+        for name, data in sections:
+            file.write(b'\0' * (layout[name] - file.tell()))
+            file.write(data)
+    os.replace(tmp_path, path)
+
+
+"""
+Part 3: Memory-mapped Views
+"""
+class LanguageModelSnapshot:
+    """
+    Read-only language model backed by a memory-mapped snapshot file.
+    Words are looked up by binary search over the sorted vocabulary, so loading does not build any Python dict.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _PREFIX.size:
+            raise ValueError('Not a language model snapshot: ' + path)
+        magic, version = _PREFIX.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version not in HEADERS:
+            raise ValueError('Not a language model snapshot: ' + path)
+        header = HEADERS[version]
+        if len(self._mmap) < header.size:
+            raise ValueError('Truncated language model snapshot: ' + path)
+        _, _, vocab_size, bigram_size, unigram_types, blob_size, *rest = header.unpack_from(self._mmap, 0)
+        confusion_size = rest[1] if len(rest) > 1 else None
+        layout = _layout(vocab_size, bigram_size, blob_size, header.size, confusion_size)
+        if len(self._mmap) < layout['end']:
+            raise ValueError('Truncated language model snapshot: ' + path)
+
+        self.vocab_size = vocab_size
+        self.bigram_size = bigram_size
+        self.unigram_types = unigram_types
+        self.log_sequence = rest[0] if rest else 0
+        self._blob_start = layout['word_blob']
+        self.word_offsets = self._array(layout['word_offsets'], '<u8', vocab_size + 1)
+        self.unigram_counts = self._array(layout['unigram_counts'], '<i8', vocab_size)
+        self.bigram_offsets = self._array(layout['bigram_offsets'], '<u8', vocab_size + 1)
+        self.bigram_successors = self._array(layout['bigram_successors'], '<u4', bigram_size)
+        self.bigram_counts = self._array(layout['bigram_counts'], '<i8', bigram_size)
+        # None for snapshots written before confusion sets were stored
+        self.confusion_offsets = self.confusion_ids = None
+        if confusion_size is not None:
+            self.confusion_offsets = self._array(layout['confusion_offsets'], '<u8', vocab_size + 1)
+            self.confusion_ids = self._array(layout['confusion_ids'], '<u4', confusion_size)
+
+        self.unigrams = SnapshotUnigrams(self)
+        self.bigrams = SnapshotBigrams(self)
+
+    def _array(self, offset: int, dtype: str, count: int):
+        return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+
+    def word(self, word_id: int) -> str:
+        start = self._blob_start + int(self.word_offsets[word_id])
+        end = self._blob_start + int(self.word_offsets[word_id + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def word_id(self, word: str) -> Optional[int]:
+        """
+        Return the integer ID of a word, or None when the word is not in the vocabulary.
+        """
+        key = word.encode('utf-8')
+        lo, hi = 0, self.vocab_size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._blob_start + int(self.word_offsets[mid])
+            end = self._blob_start + int(self.word_offsets[mid + 1])
+            if self._mmap[start:end] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.vocab_size and self.word(lo) == word:
+            return lo
+        return None
+
+    def bigram_count(self, prev_id: int, word_id: int) -> int:
+        start = int(self.bigram_offsets[prev_id])
+        end = int(self.bigram_offsets[prev_id + 1])
+        pos = start + int(np.searchsorted(self.bigram_successors[start:end], word_id))
+        if pos < end and self.bigram_successors[pos] == word_id:
+            return int(self.bigram_counts[pos])
+        return 0
+
+
+class SnapshotUnigrams(Mapping):
+    """
+    Dict-like view of the unigram counts, usable wherever freq_dict_unigram is expected.
+    """
+    def __init__(self, snapshot: LanguageModelSnapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, word: str) -> int:
+        word_id = self._snapshot.word_id(word) if isinstance(word, str) else None
+        if word_id is None or self._snapshot.unigram_counts[word_id] == 0:
+            raise KeyError(word)
+        return int(self._snapshot.unigram_counts[word_id])
+
+    def __iter__(self) -> Iterator[str]:
+        for word_id in np.flatnonzero(self._snapshot.unigram_counts):
+            yield self._snapshot.word(int(word_id))
+
+    def __len__(self) -> int:
+        return self._snapshot.unigram_types
+
+
+class SnapshotBigrams(Mapping):
+    """
+    Dict-like view of the bigram counts keyed by (previous_word, word), usable wherever freq_dict_bigram is expected.
+    """
+    def __init__(self, snapshot: LanguageModelSnapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, key: Tuple[str, str]) -> int:
+        try:
+            prev_word, word = key
+        except (TypeError, ValueError):
+            raise KeyError(key)
+        prev_id = self._snapshot.word_id(prev_word)
+        word_id = self._snapshot.word_id(word) if prev_id is not None else None
+        count = self._snapshot.bigram_count(prev_id, word_id) if word_id is not None else 0
+        if count == 0:
+            raise KeyError(key)
+        return count
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        offsets = self._snapshot.bigram_offsets
+        for prev_id in range(self._snapshot.vocab_size):
+            start, end = int(offsets[prev_id]), int(offsets[prev_id + 1])
+            if start == end:
+                continue
+            prev_word = self._snapshot.word(prev_id)
+            for pos in range(start, end):
+                yield prev_word, self._snapshot.word(int(self._snapshot.bigram_successors[pos]))
+
+    def __len__(self) -> int:
+        return self._snapshot.bigram_size
+
+
+"""
+Part 4: Snapshot Freshness
+"""
+def is_snapshot_fresh(path: str, file_dir: str) -> bool:
+    """
+    A snapshot is fresh when it exists and is not older than any corpus file matched by file_dir.
+    """
+    if not os.path.exists(path):
+        return False
+    snapshot_mtime = os.path.getmtime(path)
+    for name in glob.glob(file_dir):
+        if os.path.getmtime(name) > snapshot_mtime:
+            return False
+    return True
+
+
+def build_snapshot(file_dir: str, path: str):
+    """
+    Build step: parse the corpus and write the compiled language model to path.
+    """
+    import model_builder
+
+    freq_dict_unigram, freq_dict_bigram = model_builder.build_model(file_dir).tables()
+    write_snapshot(path, freq_dict_unigram, freq_dict_bigram)
+
+
+if __name__ == '__main__':
+    # Usage: python model_snapshot.py [corpus_glob] [snapshot_path]
+    corpus_glob = sys.argv[1] if len(sys.argv) > 1 else './data/*.txt'
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else './data/model.snapshot'
+    build_snapshot(corpus_glob, snapshot_path)
@@ -0,0 +1,120 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import os
+import json
+
+from typing import Dict, Iterator, List, Tuple
+from collections.abc import Mapping
+
+import model_builder
+import non_word_checking
+
+
+"""
+Part 1: Count Overlay
+"""
+class CountOverlay(Mapping):
+    """
+    Dict-like counts made of a base mapping (a dict or a model_snapshot view), which is never modified,
+    and a dict of deltas. A key whose count drops to 0 disappears, as from a model built without it.
+    """
+    def __init__(self, base: Mapping):
+        self.base = base
+        self.deltas = {}
+        self.size = len(base)
+
+    def get(self, key, default=None):
+        delta = self.deltas.get(key) if self.deltas else None
+        if delta is None:
+            return self.base.get(key, default)
+        count = self.base.get(key, 0) + delta
+        return count if count > 0 else default
+
+    def __getitem__(self, key) -> int:
+        count = self.get(key)
+        if count is None:
+            raise KeyError(key)
+        return count
+
+    def __contains__(self, key) -> bool:
+        if not self.deltas:
+            return key in self.base
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator:
+        for key in self.base:
+            if key not in self.deltas or self.get(key) is not None:
+                yield key
+        for key in self.deltas:
+            if key not in self.base and self.get(key) is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, key, delta: int):
+        present = key in self
+        self.deltas[key] = self.deltas.get(key, 0) + delta
+        if key in self:
+            self.size += not present
+        else:
+            self.size -= present
+
+
+"""
+Part 2: Count Text
+"""
+def count_text(text: str) -> Tuple[Dict, Dict, List[str]]:
+    """
+    Unigram and bigram counts of a text, counted like the corpus by model_builder.build_model, and its sentences.
+    Unlike in a corpus file, the text after the last '.' is a sentence too.
+    """
+    text = text.rstrip()
+    if not text.endswith('.'):
+        text += '.'
+    counts = model_builder.count_batches([non_word_checking.tokenize(text, [], [])], keep_sentences=True)
+    freq_dict_unigram, freq_dict_bigram = counts.tables()
+    return freq_dict_unigram, freq_dict_bigram, counts.sentences
+
+
+"""
+Part 3: Update Log
+"""
+class UpdateLog:
+    """
+    Append-only JSON lines file of model updates, one {"seq": n, "op": ..., ...} object per line.
+    Entries are never rewritten. A snapshot records the last entry it includes, so only newer entries are
+    replayed when it is loaded, and the whole log is replayed when the model is rebuilt from the corpus.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.sequence = 0
+        if os.path.exists(path):
+            # Drop a line cut short by a crash, so the next entry starts on its own line
+            with open(path, 'rb+') as file:
+                file.truncate(file.read().rfind(b'\n') + 1)
+        for entry in self.entries():
+            self.sequence = entry['seq']
+
+    def entries(self, after: int = 0) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                entry = json.loads(line)
+                if entry['seq'] > after:
+                    yield entry
+
+    def append(self, entry: Dict) -> int:
+        self.sequence += 1
+        entry = dict(entry, seq=self.sequence)
+        with open(self.path, 'at', encoding='utf-8') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        return self.sequence
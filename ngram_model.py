@@ -0,0 +1,262 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+    Brants et al., Large Language Models in Machine Translation (Stupid Backoff), 2007
+    Chen and Goodman, An Empirical Study of Smoothing Techniques for Language Modeling, 1998
+"""
+
+import os
+import math
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+# Bits reserved for one word ID inside a packed n-gram key
+ID_BITS = 24
+
+
+"""
+Part 1: N-gram Language Model
+"""
+class NGramModel:
+    """
+    Order-N language model over '<SOS> ... <EOS>' sentences.
+    Counts are kept in one dict per order, keyed by the word IDs of the n-gram packed into a single int.
+    Scores are natural-log probabilities, either Stupid Backoff (no normalization at query time) or
+    interpolated Kneser-Ney with precomputed continuation counts and history denominators.
+    """
+    def __init__(self, order: int = 3, smoothing: str = 'stupid_backoff', alpha: float = 0.4, discount: float = 0.75):
+        if smoothing not in ('stupid_backoff', 'kneser_ney'):
+            raise ValueError('Unknown smoothing: ' + smoothing)
+        self.order = order
+        self.smoothing = smoothing
+        self.alpha = alpha
+        self.discount = discount
+        self.ids: Dict[str, int] = {}
+        # counts[n - 1]: packed n-gram -> count
+        self.counts: List[Dict[int, int]] = [{} for _ in range(order)]
+        self.total = 0
+        # Kneser-Ney tables, built by precompute and then kept up to date by add_sentence
+        self.kn_counts = None
+
+    def _id(self, word: str) -> int:
+        word_id = self.ids.get(word)
+        if word_id is None:
+            # Larger IDs would overflow into the neighbouring word of a packed key
+            if len(self.ids) >= 1 << ID_BITS:
+                raise ValueError('Vocabulary exceeds %d words' % (1 << ID_BITS))
+            word_id = self.ids[word] = len(self.ids)
+        return word_id
+
+    @staticmethod
+    def _pack(word_ids: Sequence[int]) -> int:
+        key = 0
+        for word_id in word_ids:
+            key = (key << ID_BITS) | word_id
+        return key
+
+    def add_sentence(self, words: List[str]):
+        """
+        Count the n-grams of a sentence. Once the smoothing tables are built, only the entries that depend on
+        these n-grams are updated.
+        """
+        sos = self.ids.get('<SOS>')
+        word_ids = [self._id(w) for w in words]
+        self.total += len(word_ids)
+        update = self.kn_counts is not None and sos is not None
+        for n in range(1, self.order + 1):
+            counts = self.counts[n - 1]
+            for i in range(len(word_ids) - n + 1):
+                key = self._pack(word_ids[i:i + n])
+                count = counts.get(key, 0)
+                counts[key] = count + 1
+                if update:
+                    self._update_kneser_ney(n, key, count == 0, sos)
+        if self.kn_counts is not None and not update:
+            self.precompute()
+        self.vocab_size = len(self.ids)
+
+    def _update_kneser_ney(self, n: int, key: int, new: bool, sos: int):
+        """
+        Apply one more occurrence of the n-gram key, new when it was unseen, to the tables of precompute.
+        The count of a highest-order n-gram, or of one starting with <SOS>, is its raw count; a lower-order
+        n-gram counts the distinct words before it, which grow when a new (n + 1)-gram ends in it.
+        """
+        if n == self.order:
+            self._add_kneser_ney(n, key, new)
+        elif key >> (ID_BITS * (n - 1)) == sos:
+            self._add_kneser_ney(n, key)
+        if new and n > 1:
+            suffix = key & ((1 << (ID_BITS * (n - 1))) - 1)
+            if suffix >> (ID_BITS * (n - 2)) != sos:
+                self._add_kneser_ney(n - 1, suffix)
+
+    def _add_kneser_ney(self, n: int, key: int, new: bool = None):
+        # The highest order shares the raw counts, already incremented by the caller
+        if n < self.order:
+            counts = self.kn_counts[n - 1]
+            new = key not in counts
+            counts[key] = counts.get(key, 0) + 1
+        if n == 1:
+            self.kn_unigram_den += 1
+            self.kn_unigram_types += new
+        else:
+            histories = self.kn_histories[n - 1]
+            den, types = histories.get(key >> ID_BITS, (0, 0))
+            histories[key >> ID_BITS] = (den + 1, types + new)
+
+    def fit(self, sentences: Iterable[str]):
+        """
+        Count every n-gram up to the model order, then precompute the smoothing tables.
+        """
+        for sentence in sentences:
+            self.add_sentence(sentence.split())
+        self.precompute()
+        return self
+
+    def save(self, path: str, log_sequence: int = 0):
+        """
+        Write the counts to a NumPy archive: the words in ID order as a utf-8 blob with offsets, and per order
+        the word IDs of every n-gram (one column per position) with its count. log_sequence is the last update
+        log entry the counts contain, as in model_snapshot.
+        """
+        words = [w.encode('utf-8') for w in sorted(self.ids, key=self.ids.get)]
+        word_offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        word_offsets[1:] = np.cumsum([len(w) for w in words])
+        arrays = dict(word_blob=np.frombuffer(b''.join(words), dtype=np.uint8), word_offsets=word_offsets,
+                      header=np.array([self.order, self.total, log_sequence], dtype=np.int64))
+        mask = (1 << ID_BITS) - 1
+        for n in range(1, self.order + 1):
+            keys = list(self.counts[n - 1])
+            columns = [np.fromiter(((key >> (ID_BITS * (n - 1 - i))) & mask for key in keys), dtype=np.int32, count=len(keys))
+                       for i in range(n)]
+            arrays['ids_%d' % n] = np.stack(columns, axis=1) if keys else np.zeros((0, n), dtype=np.int32)
+            arrays['counts_%d' % n] = np.fromiter(self.counts[n - 1].values(), dtype=np.int64, count=len(keys))
+        # Written next to the target and renamed, so a reader never sees a partial file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, smoothing: str = 'stupid_backoff', alpha: float = 0.4, discount: float = 0.75) -> Tuple['NGramModel', int]:
+        """
+        Read counts written by save and precompute the smoothing tables.
+        Return the model and the last update log entry its counts contain.
+        """
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        order, total, log_sequence = arrays['header'].tolist()
+        model = cls(order, smoothing, alpha, discount)
+        blob, offsets = arrays['word_blob'].tobytes(), arrays['word_offsets'].tolist()
+        model.ids = {blob[offsets[i]:offsets[i + 1]].decode('utf-8'): i for i in range(len(offsets) - 1)}
+        model.total = total
+        for n in range(1, order + 1):
+            word_ids = arrays['ids_%d' % n]
+            keys = word_ids[:, 0].tolist()
+            for i in range(1, n):
+                keys = [(key << ID_BITS) | word_id for key, word_id in zip(keys, word_ids[:, i].tolist())]
+            model.counts[n - 1] = dict(zip(keys, arrays['counts_%d' % n].tolist()))
+        model.precompute()
+        return model, log_sequence
+
+    def precompute(self):
+        """
+        Build the Kneser-Ney tables: for lower orders the count of an n-gram is replaced by the number of
+        distinct words preceding it (raw counts are kept for n-grams starting with <SOS>, which never have a
+        predecessor), and every history gets its denominator and its number of distinct successors.
+        """
+        self.vocab_size = len(self.ids)
+        if self.smoothing != 'kneser_ney':
+            return
+
+        sos = self.ids.get('<SOS>')
+        self.kn_counts = [None] * self.order
+        self.kn_counts[self.order - 1] = self.counts[self.order - 1]
+        for n in range(self.order - 1, 0, -1):
+            continuation = {}
+            for key in self.counts[n]:
+                suffix = key & ((1 << (ID_BITS * n)) - 1)
+                continuation[suffix] = continuation.get(suffix, 0) + 1
+            for key, count in self.counts[n - 1].items():
+                if key >> (ID_BITS * (n - 1)) == sos:
+                    continuation[key] = count
+            self.kn_counts[n - 1] = continuation
+
+        # histories[n - 1]: packed history of length n - 1 -> (denominator, distinct successors), for n >= 2
+        self.kn_histories = [None] * self.order
+        for n in range(2, self.order + 1):
+            histories = {}
+            for key, count in self.kn_counts[n - 1].items():
+                history = key >> ID_BITS
+                den, types = histories.get(history, (0, 0))
+                histories[history] = (den + count, types + 1)
+            self.kn_histories[n - 1] = histories
+        self.kn_unigram_den = sum(self.kn_counts[0].values())
+        self.kn_unigram_types = len(self.kn_counts[0])
+
+    def score(self, word: str, history: Sequence[str] = ()) -> float:
+        """
+        Log score of word after the given history; only the last order - 1 history words are used.
+        """
+        history = list(history)[len(history) - self.order + 1:] if self.order > 1 else []
+        if self.smoothing == 'stupid_backoff':
+            return self._stupid_backoff(word, history)
+        return math.log(self._kneser_ney(word, history))
+
+    def candidate_scores(self, history: Sequence[str], words: List[str]) -> List[float]:
+        return [self.score(w, history) for w in words]
+
+    def sentence_score(self, sent: str) -> float:
+        """
+        Sum of the log scores of every word after the first, like bigram_sentence_probability in log space.
+        """
+        words = sent.split()
+        return sum(self.score(words[i], words[max(0, i - self.order + 1):i]) for i in range(1, len(words)))
+
+    def _stupid_backoff(self, word: str, history: List[str]) -> float:
+        word_id = self.ids.get(word)
+        if word_id is None:
+            return len(history) * math.log(self.alpha) - math.log(self.total + self.vocab_size)
+
+        history_ids = [self.ids.get(w) for w in history]
+        penalty = 0.0
+        for start in range(len(history_ids) + 1):
+            context = history_ids[start:]
+            if None in context:
+                penalty += math.log(self.alpha)
+                continue
+            n = len(context) + 1
+            count = self.counts[n - 1].get(self._pack(context + [word_id]), 0)
+            if count > 0:
+                if n == 1:
+                    return penalty + math.log(count / self.total)
+                return penalty + math.log(count / self.counts[n - 2][self._pack(context)])
+            penalty += math.log(self.alpha)
+        return penalty + math.log(1 / (self.total + self.vocab_size))
+
+    def _kneser_ney(self, word: str, history: List[str]) -> float:
+        d = self.discount
+        word_id = self.ids.get(word)
+
+        # Lowest order: continuation probability interpolated with a uniform distribution over V + 1 words
+        count = self.kn_counts[0].get(word_id, 0) if word_id is not None else 0
+        p = (max(count - d, 0) + d * self.kn_unigram_types / (self.vocab_size + 1)) / self.kn_unigram_den
+
+        history_ids = [self.ids.get(w) for w in history]
+        for n in range(2, len(history_ids) + 2):
+            context = history_ids[len(history_ids) - n + 1:]
+            if None in context:
+                continue
+            history_key = self._pack(context)
+            entry = self.kn_histories[n - 1].get(history_key)
+            if entry is None:
+                continue
+            den, types = entry
+            count = self.kn_counts[n - 1].get((history_key << ID_BITS) | word_id, 0) if word_id is not None else 0
+            p = max(count - d, 0) / den + d * types / den * p
+        return p
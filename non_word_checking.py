@@ -9,18 +9,29 @@ import re
 import sys
 import math
 import glob
+import heapq
 import string
 
-from typing import List, Dict, Tuple
+from typing import Iterator, List, Dict, Tuple
 from collections import OrderedDict
 from operator import itemgetter
 
 import numpy as np
 
+import metrics
+
 
 """
 Part 1: Tokenization
 """
+# Characters read per chunk when streaming a corpus file
+CHUNK_SIZE = 1 << 20
+# Positions where a chunk may end, see _find_chunk_boundary
+_CHUNK_BOUNDARY = re.compile(r'[a-rt-zA-RT-Z](?=[A-Za-z])')
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+# Words of editor text and documents, shared by the highlighter and the batch tools
+wordRegEx = re.compile(r"\b([A-Za-z]{1,})\b")
+
 def remove_punctuations(text: str):
     """
     Remove the punctuation marks, special symbols from the tokens.
@@ -29,9 +40,7 @@ def remove_punctuations(text: str):
     for x in punct:
         text = text.replace(x, '')
 
-    for x in text:
-        if x.isdigit():
-            text = text.replace(x, '')
+    text = ''.join([x for x in text if not x.isdigit()])
 
     text = text.replace("\n\n", ". ")
     text = text.replace(".\n\n", ". ")
@@ -43,54 +52,123 @@ def remove_punctuations(text: str):
     return text
 
 
-def tokenize(text: str, sent: List, tok: List):
+def _find_chunk_boundary(text: str) -> int:
     """
-    Tokenize the corpus into words and sentences
+    Find the end of the longest prefix of text that can be preprocessed on its own.
+    A chunk may only end after an ASCII letter (other than 's') that is followed by another ASCII letter:
+    such a letter survives remove_punctuations and takes part in none of its patterns, so the replacements
+    on both sides of it never interact. Return 0 when no such position exists.
     """
-    text = text.lower()
-    text = remove_punctuations(text)
+    match = None
+    start = len(text)
+    while match is None and start > 0:
+        start = max(0, start - 4096)
+        for match in _CHUNK_BOUNDARY.finditer(text, start):
+            pass
+    return match.end() if match is not None else 0
 
-    sentences = []
-    s = '<SOS> '
-    for word in text:
-        if word.endswith('.'):
-            word = word[:-1]
-            s = s + word + ' <EOS>'
 
+def iter_text_chunks(file, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Read a text file in chunks of about chunk_size characters that can be tokenized independently.
+    """
+    carry = ''
+    while True:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        text = carry + data
+        cut = _find_chunk_boundary(text)
+        if cut > 0:
+            yield text[:cut]
+        carry = text[cut:]
+    if carry:
+        yield carry
+
+
+class StreamTokenizer:
+    """
+    Incremental tokenizer producing the same sentences and tokens as tokenizing the whole text at once.
+    Each chunk fed in must end on a boundary found by iter_text_chunks.
+    """
+    def __init__(self):
+        # Pieces of the sentence that has not reached its '.' yet
+        self.sentence_parts = []
+        # Tail of the last chunk, which may continue in the next chunk
+        self.token_carry = ''
+
+    def feed(self, chunk: str) -> Tuple[List, List]:
+        text = remove_punctuations(chunk.lower())
+
+        sentences = []
+        pieces = text.split('.')
+        for piece in pieces[:-1]:
+            self.sentence_parts.append(piece)
+            s = '<SOS> ' + ''.join(self.sentence_parts) + ' <EOS>'
             if s != '<SOS>  <EOS>':
                 s = s.replace('  ', ' ')
                 sentences.append(s.strip())
-            s = '<SOS> '
+            self.sentence_parts = []
+        self.sentence_parts.append(pieces[-1])
+
+        text = self.token_carry + text
+        tokens = text.split()
+        self.token_carry = ''
+        if tokens and not text[-1].isspace():
+            self.token_carry = tokens.pop()
+        return [w.translate(_PUNCT_TABLE) for w in tokens], sentences
+
+    def close(self) -> Tuple[List, List]:
+        """
+        Flush the last token. Text after the last '.' never forms a sentence.
+        """
+        tokens = [self.token_carry.translate(_PUNCT_TABLE)] if self.token_carry else []
+        self.sentence_parts = []
+        self.token_carry = ''
+        return tokens, []
+
+
+def stream_tokenize(file, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[List, List]]:
+    """
+    Lazily tokenize a text file, yielding a (tokens, sentences) batch per chunk with bounded memory.
+    """
+    tokenizer = StreamTokenizer()
+    for chunk in iter_text_chunks(file, chunk_size):
+        yield tokenizer.feed(chunk)
+    tokens, sentences = tokenizer.close()
+    if tokens:
+        yield tokens, sentences
 
-        else:
-            s = s + word
-
-    for sent1 in sentences:
-        if sent1 == ' ':
-            remove_punctuations(sent1)
-
-    sent.extend(sentences)
-    tokens = text.split()
-    lower_tokens = []
-    for x in tokens:
-        lower_tokens.append(x.lower())
-    punct = string.punctuation
-    table = str.maketrans('', '', punct)
-    stripped = [w.translate(table) for w in tokens]
-    tok.extend(stripped)
+
+def tokenize(text: str, sent: List, tok: List):
+    """
+    Tokenize the corpus into words and sentences
+    """
+    tokenizer = StreamTokenizer()
+    for tokens, sentences in (tokenizer.feed(text), tokenizer.close()):
+        sent.extend(sentences)
+        tok.extend(tokens)
     return tok, sent
 
 
+def iter_corpus(file_dir: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[List, List]]:
+    """
+    Lazily tokenize every file matched by file_dir.
+    """
+    files = glob.glob(file_dir)
+
+    for name in files:
+        with open(name, 'rt', encoding="ISO-8859-1") as file:
+            yield from stream_tokenize(file, chunk_size)
+
+
 def get_tokens(file_dir: str):
     sentences = []
     tokens = []
 
-    files = glob.glob(file_dir)
-
-    for name in files:
-        file = open(name, 'rt', encoding="ISO-8859-1")
-        text = file.read()
-        tokens, sentences = tokenize(text, sentences, tokens)
+    for batch_tokens, batch_sentences in iter_corpus(file_dir):
+        tokens.extend(batch_tokens)
+        sentences.extend(batch_sentences)
 
     return tokens, sentences
 
@@ -109,6 +187,7 @@ def unigramLangModel(words: str, start_sentence: str, end_sentence: str, freq_di
 """
 Part 3: Minimum Edit Distance
 """
+@metrics.timed('edit_distance_seconds')
 def edit_distance(word, alphabet):
     splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
     deletes = [a + b[1:] for a, b in splits if b]
@@ -118,54 +197,179 @@ def edit_distance(word, alphabet):
     return set(deletes + transposes + replaces + inserts)
 
 
+@metrics.timed('edit_distance2_seconds')
 def edit_distance2(word, alphabet):
     return set(e2 for e1 in edit_distance(word, alphabet) for e2 in edit_distance(e1, alphabet))
 
 
-def cal_med(s: str, t: str):
-    if s == '':
-        return len(t)
-    if t == '':
-        return len(s)
-    if s[-1] == t[-1]:
-        cost = 0
-    else:
-        cost = 1
+def bounded_edit_distance(s: str, t: str, max_distance: int = None, transpositions: bool = False) -> int:
+    """
+    Iterative edit distance between s and t, computed one row at a time.
+    With transpositions=True adjacent swaps cost 1 (optimal string alignment), as in edit_distance.
+    When max_distance is given the computation stops as soon as every entry of a row exceeds it,
+    and max_distance + 1 is returned for any pair further apart than max_distance.
+    """
+    if max_distance is not None and abs(len(s) - len(t)) > max_distance:
+        return max_distance + 1
+
+    previous2 = None
+    previous = list(range(len(t) + 1))
+    for i in range(1, len(s) + 1):
+        current = [i] + [0] * len(t)
+        for j in range(1, len(t) + 1):
+            cost = 0 if s[i - 1] == t[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if transpositions and i > 1 and j > 1 and s[i - 1] == t[j - 2] and s[i - 2] == t[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+
+    distance = previous[len(t)]
+    if max_distance is not None and distance > max_distance:
+        return max_distance + 1
+    return distance
+
+
+@metrics.timed('cal_med_seconds')
+def cal_med(s: str, t: str, max_distance: int = None):
+    """
+    Minimum edit distance (insertions, deletions and replacements) shown in the suggestion labels.
+    """
+    return bounded_edit_distance(s, t, max_distance)
 
-    res = min([cal_med(s[:-1], t) + 1,
-               cal_med(s, t[:-1]) + 1,
-               cal_med(s[:-1], t[:-1]) + cost])
 
-    return res
+@metrics.timed('cal_med_batch_seconds')
+def cal_med_batch(word: str, candidates: List[str], max_distance: int = None, transpositions: bool = False, use_numpy: bool = False) -> List[int]:
+    """
+    Score one word against many candidates. The NumPy path runs the same dynamic program for all
+    candidates at once, one query character and candidate position at a time, which pays off for large batches.
+    """
+    if not use_numpy or len(candidates) == 0:
+        return [bounded_edit_distance(word, c, max_distance, transpositions) for c in candidates]
+
+    n = len(candidates)
+    lengths = np.array([len(c) for c in candidates])
+    width = int(lengths.max())
+    # Candidate characters as code points, padded with -1 which never matches a query character
+    chars = np.full((n, width), -1, dtype=np.int64)
+    for k, c in enumerate(candidates):
+        chars[k, :len(c)] = [ord(x) for x in c]
+
+    previous2 = None
+    previous = np.tile(np.arange(width + 1), (n, 1))
+    for i in range(1, len(word) + 1):
+        code = ord(word[i - 1])
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        for j in range(1, width + 1):
+            cost = (chars[:, j - 1] != code).astype(np.int64)
+            best = np.minimum(np.minimum(previous[:, j] + 1, current[:, j - 1] + 1), previous[:, j - 1] + cost)
+            if transpositions and i > 1 and j > 1:
+                swapped = (chars[:, j - 2] == code) & (chars[:, j - 1] == ord(word[i - 2]))
+                best = np.where(swapped, np.minimum(best, previous2[:, j - 2] + 1), best)
+            current[:, j] = best
+        if max_distance is not None and (current.min(axis=1) > max_distance).all():
+            return [max_distance + 1] * n
+        previous2, previous = previous, current
+
+    distances = previous[np.arange(n), lengths]
+    if max_distance is not None:
+        distances = np.minimum(distances, max_distance + 1)
+    return [int(d) for d in distances]
 
 
 """
 Part 4: Spelling Correction
 """
-def spell_checker(word, alphabet, n_grams, need_2_med=True) -> Tuple:
+@metrics.timed('spell_checker_seconds')
+def spell_checker(word, alphabet, n_grams, need_2_med=True, candidate_index=None) -> Tuple:
     """
     Take a word as input and check whether the word is in vocabulary dictionary.
+    With a candidate_index (candidate_index.DeletionIndex or VocabularyTrie over the keys of n_grams) the
+    suggestions are looked up in the index instead of generating every edit over the alphabet, and n_grams
+    is only used for membership checks, so it may also be a compressed_model.BloomFilter or CompressedBigramModel.
     """
     word = word.lower()
 
-    if word in n_grams.keys():
+    if word in n_grams:
         return True, 'correct'
     else:
 
-        suggestion_set = set(edit_distance(word, alphabet)) & set(n_grams.keys())
+        if candidate_index is not None:
+            suggestion_set = candidate_index.lookup(word, 1)
+        else:
+            suggestion_set = set(edit_distance(word, alphabet)) & set(n_grams.keys())
 
         if need_2_med and len(suggestion_set) == 0:
-            suggestion_set = set(edit_distance2(word, alphabet)) & set(n_grams.keys())
+            if candidate_index is not None:
+                suggestion_set = candidate_index.lookup(word, 2)
+            else:
+                suggestion_set = set(edit_distance2(word, alphabet)) & set(n_grams.keys())
 
+        if metrics.enabled:
+            metrics.observe('spell_checker_candidates', len(suggestion_set))
+
+        suggestion_list = list(suggestion_set)
         suggestion_dict = OrderedDict()
-        for i in suggestion_set:
-            temp_med = cal_med(word, i)
+        for i, temp_med in zip(suggestion_list, cal_med_batch(word, suggestion_list)):
             temp = i + ' (Non-word Error with MED: ' + str(temp_med) + ')'
             suggestion_dict[temp] = temp_med
 
         return False, suggestion_dict
 
 
+# Error model of top_k_suggestions: log probability of one edit, about one typo per ten thousand letters typed
+EDIT_LOG_PROB = math.log(1e-4)
+
+
+def _rank_candidates(candidates, distance: int, n_grams, log_total: float, edit_log_prob: float) -> List[Tuple[float, str]]:
+    # Sorted first, so candidates with equal scores come out in alphabetical order
+    return [(math.log(n_grams[c]) - log_total + distance * edit_log_prob, c) for c in sorted(candidates) if c != '']
+
+
+@metrics.timed('top_k_suggestions_seconds')
+def top_k_suggestions(word, k, alphabet, n_grams, candidate_index=None, total=None, max_count=None,
+                      edit_log_prob=EDIT_LOG_PROB) -> Tuple:
+    """
+    Like spell_checker, but return only the k best suggestions, best first, ranked by the noisy channel score
+    log P(candidate) + edits * edit_log_prob. Distance-2 candidates are generated only when fewer than k
+    distance-1 candidates exist or the most frequent word at distance 2 could still beat the k-th best.
+    total and max_count are the sum and maximum of the counts in n_grams; pass them to avoid a scan per call.
+    """
+    word = word.lower()
+    if word in n_grams:
+        return True, 'correct'
+
+    if total is None:
+        total = sum(n_grams.values())
+    if max_count is None:
+        max_count = max(n_grams.values())
+    log_total = math.log(total)
+
+    if candidate_index is not None:
+        first = candidate_index.lookup(word, 1)
+    else:
+        first = set(edit_distance(word, alphabet)) & n_grams.keys()
+    ranked = heapq.nlargest(k, _rank_candidates(first, 1, n_grams, log_total, edit_log_prob), key=itemgetter(0))
+
+    # Upper bound of the score of any distance-2 candidate
+    bound = math.log(max_count) - log_total + 2 * edit_log_prob
+    if len(ranked) < k or ranked[-1][0] < bound:
+        if candidate_index is not None:
+            second = candidate_index.lookup(word, 2) - first
+        else:
+            second = set(edit_distance2(word, alphabet)) & n_grams.keys() - first
+        ranked = heapq.nlargest(k, ranked + _rank_candidates(second, 2, n_grams, log_total, edit_log_prob), key=itemgetter(0))
+
+    # Display strings only for the returned suggestions
+    returned = [c for _, c in ranked]
+    suggestion_dict = OrderedDict()
+    for i, temp_med in zip(returned, cal_med_batch(word, returned)):
+        suggestion_dict[i + ' (Non-word Error with MED: ' + str(temp_med) + ')'] = temp_med
+    return False, suggestion_dict
+
+
 """
 Part 5: Build Language Model
 """
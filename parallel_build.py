@@ -0,0 +1,173 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import os
+import glob
+import argparse
+
+from typing import Dict, List, Tuple
+from collections import Counter
+from multiprocessing import Pool
+
+import non_word_checking
+
+
+# Bytes of a corpus file tokenized by one worker task
+RANGE_SIZE = 8 << 20
+
+
+"""
+Part 1: Split Corpus Files
+"""
+def split_file(path: str, range_size: int = RANGE_SIZE) -> List[Tuple[str, int, int]]:
+    """
+    Cut a corpus file into (path, start, end) byte ranges of about range_size bytes.
+    Corpus files are read as ISO-8859-1, so a byte is a character, and every cut is moved forward to a
+    boundary found by non_word_checking._find_chunk_boundary, where the ranges can be preprocessed independently.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as file:
+        while size - start > range_size:
+            cut = None
+            position = start + range_size
+            while cut is None and position < size:
+                file.seek(position)
+                window = file.read(4096).decode('ISO-8859-1')
+                match = non_word_checking._CHUNK_BOUNDARY.search(window)
+                if match is not None:
+                    cut = position + match.end()
+                position += 4095
+            if cut is None:
+                break
+            ranges.append((path, start, cut))
+            start = cut
+    ranges.append((path, start, size))
+    return ranges
+
+
+"""
+Part 2: Count Shards
+"""
+def sentence_bigrams(content: str, freq_dict_bigram: Counter):
+    """
+    Count the bigrams of the sentence '<SOS> ' + content + ' <EOS>' the way bigramLangModel sees it.
+    """
+    if content == '':
+        return
+    words = ['<SOS>'] + content.split() + ['<EOS>']
+    freq_dict_bigram.update(zip(words, words[1:]))
+
+
+def count_range(task: Tuple[str, int, int]) -> Dict:
+    """
+    Worker: tokenize one byte range and count the unigrams and bigrams that lie entirely inside it.
+    The token and the sentence cut by each end of the range are returned as text, to be stitched by merge_shards.
+    """
+    path, start, end = task
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start).decode('ISO-8859-1')
+    # Universal newlines, as when the file is opened in text mode
+    data = data.replace('\r\n', '\n').replace('\r', '\n')
+    text = non_word_checking.remove_punctuations(data.lower())
+
+    shard = {'unigrams': Counter(), 'bigrams': Counter(), 'text': None}
+
+    pieces = text.split('.')
+    shard['sentence_dot'] = len(pieces) > 1
+    shard['sentence_head'], shard['sentence_tail'] = pieces[0], pieces[-1]
+    for content in pieces[1:-1]:
+        sentence_bigrams(content, shard['bigrams'])
+
+    tokens = text.split()
+    shard['token_space'] = len(tokens) != 1 or text[0].isspace() or text[-1].isspace()
+    shard['token_head'] = tokens.pop(0) if tokens and not text[0].isspace() else ''
+    shard['token_tail'] = tokens.pop() if tokens and not text[-1].isspace() else ''
+    shard['unigrams'].update(w.translate(non_word_checking._PUNCT_TABLE) for w in tokens)
+
+    if not shard['token_space'] or not shard['sentence_dot']:
+        shard['text'] = text
+    return shard
+
+
+"""
+Part 3: Merge Shards
+"""
+class ShardMerger:
+    """
+    Reduce step: adds shard counts into the totals and stitches the tokens and sentences cut at range ends.
+    Shards of one file must be merged in order; call end_file() after the last shard of every file.
+    """
+    def __init__(self):
+        self.unigrams = Counter()
+        self.bigrams = Counter()
+        self.token_pending = ''
+        self.sentence_pending = ''
+
+    def merge(self, shard: Dict):
+        self.unigrams.update(shard['unigrams'])
+        self.bigrams.update(shard['bigrams'])
+
+        if not shard['token_space']:
+            self.token_pending += shard['text'].strip()
+        else:
+            token = self.token_pending + shard['token_head']
+            if token:
+                self.unigrams[token.translate(non_word_checking._PUNCT_TABLE)] += 1
+            self.token_pending = shard['token_tail']
+
+        if not shard['sentence_dot']:
+            self.sentence_pending += shard['text']
+        else:
+            sentence_bigrams(self.sentence_pending + shard['sentence_head'], self.bigrams)
+            self.sentence_pending = shard['sentence_tail']
+
+    def end_file(self):
+        # The last token of a file is kept; text after its last '.' never forms a sentence
+        if self.token_pending:
+            self.unigrams[self.token_pending.translate(non_word_checking._PUNCT_TABLE)] += 1
+        self.token_pending = ''
+        self.sentence_pending = ''
+
+
+def build_counts(file_dir: str, processes: int = None, range_size: int = RANGE_SIZE) -> Tuple[Dict, Dict]:
+    """
+    Count unigrams and bigrams of every file matched by file_dir in a process pool.
+    The result equals model_builder.build_model(file_dir).tables(), the counts SpellCheckEngine writes into its
+    snapshot, so the snapshot does not depend on which tool built it; peak memory depends on the range size and the number of distinct n-grams,
+    not on the corpus size.
+    """
+    files = glob.glob(file_dir)
+    tasks = [task for name in files for task in split_file(name, range_size)]
+
+    merger = ShardMerger()
+    with Pool(processes) as pool:
+        for task, shard in zip(tasks, pool.imap(count_range, tasks)):
+            merger.merge(shard)
+            if task[2] == os.path.getsize(task[0]):
+                merger.end_file()
+
+    return dict(merger.unigrams), dict(merger.bigrams)
+
+
+def build_snapshot(file_dir: str, path: str, processes: int = None, range_size: int = RANGE_SIZE):
+    import model_snapshot
+
+    freq_dict_unigram, freq_dict_bigram = build_counts(file_dir, processes, range_size)
+    model_snapshot.write_snapshot(path, freq_dict_unigram, freq_dict_bigram)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the language model snapshot with a process pool.')
+    parser.add_argument('corpus', nargs='?', default='./data/*.txt')
+    parser.add_argument('snapshot', nargs='?', default='./data/model.snapshot')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--range-size', type=int, default=RANGE_SIZE)
+    args = parser.parse_args()
+    build_snapshot(args.corpus, args.snapshot, args.processes, args.range_size)
@@ -8,8 +8,6 @@ References:
 import re
 import sys
 import math
-import glob
-import string
 
 from typing import List, Dict, Tuple
 from collections import OrderedDict
@@ -17,86 +15,14 @@ from operator import itemgetter
 
 import numpy as np
 
-
-"""
-Part 1: Tokenization
-"""
-def remove_punctuations(text: str):
-    """
-    Remove the punctuation marks, special symbols from the tokens.
-    """
-    punct = ["[", "]", "'s", "(", ")", "!", "\"", "%", "$", "*", "&", "^", "=", "+", "`", "'", ","]
-    for x in punct:
-        text = text.replace(x, '')
-
-    for x in text:
-        if x.isdigit():
-            text = text.replace(x, '')
-
-    text = text.replace("\n\n", ". ")
-    text = text.replace(".\n\n", ". ")
-    text = text.replace("..", ".")
-
-    p = [":--", "-", "\n", "  ", "_", ",", ";", ":", "?", "/", "{", "}"]
-    for pp in p:
-        text = text.replace(pp, ' ')
-    return text
-
-
-def tokenize(text: str, sent: List, tok: List):
-    """
-    Tokenize the corpus into words and sentences
-    """
-    text = text.lower()
-    text = remove_punctuations(text)
-
-    sentences = []
-    s = '<SOS> '
-    for word in text:
-        if word.endswith('.'):
-            word = word[:-1]
-            s = s + word + ' <EOS>'
-
-            if s != '<SOS>  <EOS>':
-                s = s.replace('  ', ' ')
-                sentences.append(s.strip())
-            s = '<SOS> '
-
-        else:
-            s = s + word
-
-    for sent1 in sentences:
-        if sent1 == ' ':
-            remove_punctuations(sent1)
-
-    sent.extend(sentences)
-    tokens = text.split()
-    lower_tokens = []
-    for x in tokens:
-        lower_tokens.append(x.lower())
-    punct = string.punctuation
-    table = str.maketrans('', '', punct)
-    stripped = [w.translate(table) for w in tokens]
-    tok.extend(stripped)
-    return tok, sent
-
-
-def get_tokens(file_dir: str):
-    sentences = []
-    tokens = []
-
-    files = glob.glob(file_dir)
-
-    for name in files:
-        file = open(name, 'rt')
-        text = file.read()
-        tokens, sentences = tokenize(text, sentences, tokens)
-
-    return tokens, sentences
+import metrics
+# Corpus tokenization lives in non_word_checking; its names stay importable from this module
+from non_word_checking import (CHUNK_SIZE, StreamTokenizer, get_tokens, iter_corpus, iter_text_chunks,
+                               remove_punctuations, stream_tokenize, tokenize)
 
 
 """
-Part 2: Define Unigram Language Model and Bigram Language Model
+Part 1: Define Unigram Language Model and Bigram Language Model
 """
 def unigramLangModel(words: str, start_sentence: str, end_sentence: str, freq_dict_unigram: Dict) -> Dict:
     for word in words:
@@ -121,7 +47,7 @@ def bigramLangModel(sentences: str, start_sentence: str, end_sentence: str, freq
 
 
 """
-Part 3: Laplace Smoothing Techniques
+Part 2: Laplace Smoothing Techniques
 """
 def laplace_smoothing(num: int, deno: int, freq_dict_unigram: Dict):
     num += 1
@@ -130,8 +56,9 @@ def laplace_smoothing(num: int, deno: int, freq_dict_unigram: Dict):
 
 
 """
-Part 4: Compute Sentence Score
+Part 3: Compute Sentence Score
 """
+@metrics.timed('bigram_sentence_probability_seconds')
 def bigram_sentence_probability(sent, freq_dict_unigram: Dict, freq_dict_bigram: Dict):
     """
     Calculate the score for a sentence using Bigram Language model.
@@ -163,9 +90,318 @@ def cal_bigram_probability(prev_word, word, freq_dict_unigram: Dict, freq_dict_b
 
 
 """
-Part 5: Build Language Model
+Part 4: Build Language Model
 """
 def language_model(tokens, sentences, start_sentence: str, end_sentence: str, freq_dict_unigram: Dict, freq_dict_bigram: Dict):
     freq_dict_unigram = unigramLangModel(tokens, start_sentence, end_sentence, freq_dict_unigram)
     freq_dict_bigram = bigramLangModel(sentences, start_sentence, end_sentence, freq_dict_bigram)
     return freq_dict_unigram, freq_dict_bigram
+
+
+"""
+Part 5: Compact Bigram Language Model
+"""
+class CompactBigramModel:
+    """
+    Array-backed bigram model keyed by integer word IDs.
+    Unigram counts live in a NumPy array and bigram counts in a CSR-style table: the successors of word ID p
+    are successors[row_offsets[p]:row_offsets[p + 1]], sorted, with their counts at the same positions.
+    Scores are the Laplace-smoothed probabilities of cal_bigram_probability, also available in log space
+    with the smoothing denominators of every history precomputed.
+    Counts can be changed in place with apply_counts; changed bigrams are kept in per-row dicts of deltas
+    on top of the CSR table, and words new to the model get IDs after the existing ones.
+    """
+    def __init__(self, word_id, unigram_counts, unigram_types: int, row_offsets, successors, counts, word=None):
+        # Callables returning the ID of a word (None when it is not in the vocabulary) and the word of an ID
+        self.base_word_id = word_id
+        self.base_word = word
+        self.base_size = len(unigram_counts)
+        # Words added by apply_counts, with IDs from base_size on, and bigram count deltas per previous word ID
+        self.added_ids = {}
+        self.added_words = []
+        self.added_bigrams: Dict[int, Dict[int, int]] = {}
+        self.unigram_counts = unigram_counts
+        self.unigram_types = unigram_types
+        self.row_offsets = row_offsets
+        self.successors = successors
+        self.counts = counts
+
+        # log(count(prev_word) + V + 1) per history, precomputed for the V of denominator_types, and for a history
+        # outside the vocabulary
+        self.log_denominators = np.log(unigram_counts.astype(np.float64) + (unigram_types + 1))
+        self.denominator_types = unigram_types
+        self.log_unknown_denominator = math.log(unigram_types + 1)
+
+        # (unigram counts, row offsets, log denominators) owned by the model, with room for more words; the arrays
+        # above become views of them on the first apply_counts (snapshot arrays are read-only memory maps)
+        self._buffers = None
+
+    @classmethod
+    def from_dicts(cls, freq_dict_unigram: Dict, freq_dict_bigram: Dict):
+        ids = {}
+        for word in freq_dict_unigram:
+            ids.setdefault(word, len(ids))
+        for prev_word, word in freq_dict_bigram:
+            ids.setdefault(prev_word, len(ids))
+            ids.setdefault(word, len(ids))
+        vocab_size = len(ids)
+
+        unigram_counts = np.zeros(vocab_size, dtype=np.int64)
+        for word, count in freq_dict_unigram.items():
+            unigram_counts[ids[word]] = count
+
+        size = len(freq_dict_bigram)
+        prev_ids = np.fromiter((ids[p] for p, _ in freq_dict_bigram), dtype=np.int64, count=size)
+        word_ids = np.fromiter((ids[w] for _, w in freq_dict_bigram), dtype=np.int64, count=size)
+        counts = np.fromiter(freq_dict_bigram.values(), dtype=np.int64, count=size)
+        order = np.lexsort((word_ids, prev_ids))
+        row_offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        row_offsets[1:] = np.cumsum(np.bincount(prev_ids, minlength=vocab_size))
+
+        return cls(ids.get, unigram_counts, len(freq_dict_unigram), row_offsets,
+                   word_ids[order].astype(np.int32), counts[order], list(ids).__getitem__)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Share the memory-mapped arrays of a model_snapshot.LanguageModelSnapshot without copying them.
+        """
+        return cls(snapshot.word_id, snapshot.unigram_counts, snapshot.unigram_types, snapshot.bigram_offsets,
+                   snapshot.bigram_successors, snapshot.bigram_counts, snapshot.word)
+
+    def word_id(self, word: str):
+        word_id = self.base_word_id(word)
+        if word_id is None and self.added_ids:
+            return self.added_ids.get(word)
+        return word_id
+
+    def word(self, word_id: int) -> str:
+        if word_id >= self.base_size:
+            return self.added_words[word_id - self.base_size]
+        return self.base_word(word_id)
+
+    def bigram_counts(self, prev_id, word_ids: np.ndarray) -> np.ndarray:
+        """
+        Counts of (prev_id, w) for every w in word_ids, found with one binary search over the row of prev_id.
+        Negative IDs stand for unknown words and get a count of 0.
+        """
+        result = np.zeros(len(word_ids), dtype=np.int64)
+        if prev_id is None:
+            return result
+        start, end = int(self.row_offsets[prev_id]), int(self.row_offsets[prev_id + 1])
+        row = self.successors[start:end]
+        if len(row) > 0:
+            pos = np.minimum(np.searchsorted(row, word_ids), len(row) - 1)
+            found = (row[pos] == word_ids) & (word_ids >= 0)
+            result[found] = self.counts[start:end][pos[found]]
+        added = self.added_bigrams.get(prev_id)
+        if added:
+            result += np.array([added.get(w, 0) for w in word_ids.tolist()], dtype=np.int64)
+        return result
+
+    def candidate_probabilities(self, prev_word: str, words: List[str]) -> np.ndarray:
+        """
+        Smoothed P(word | prev_word) for many candidate words in one vectorized lookup.
+        """
+        prev_id = self.word_id(prev_word)
+        word_ids = np.array([-1 if i is None else i for i in map(self.word_id, words)], dtype=np.int64)
+        num = self.bigram_counts(prev_id, word_ids).astype(np.float64) + 1
+        deno = (int(self.unigram_counts[prev_id]) if prev_id is not None else 0) + self.unigram_types + 1
+        return num / float(deno)
+
+    def sentence_probability(self, sent) -> float:
+        """
+        Same score as bigram_sentence_probability, computed from the compact tables.
+        """
+        sum = 0.0
+        previous_word = None
+        for word in sent.split():
+            if previous_word is not None:
+                sum += float(self.candidate_probabilities(previous_word, [word])[0])
+            previous_word = word
+        return sum
+
+    def ids(self, words: List[str]) -> np.ndarray:
+        # -1 stands for a word outside the vocabulary
+        return np.array([-1 if i is None else i for i in map(self.word_id, words)], dtype=np.int64)
+
+    def row_counts(self, prev_ids: np.ndarray, word_id: int) -> np.ndarray:
+        """
+        Counts of (p, word_id) for every p in prev_ids: one binary search per row, run for all rows at once.
+        """
+        known = prev_ids >= 0
+        lo = np.where(known, self.row_offsets[np.maximum(prev_ids, 0)], 0).astype(np.int64)
+        hi = np.where(known, self.row_offsets[np.maximum(prev_ids, 0) + 1], 0).astype(np.int64)
+        end = hi.copy()
+        if word_id is None or len(self.successors) == 0:
+            return np.zeros(len(prev_ids), dtype=np.int64)
+        while (lo < hi).any():
+            active = lo < hi
+            mid = (lo + hi) // 2
+            below = self.successors[np.minimum(mid, len(self.successors) - 1)] < word_id
+            lo = np.where(active & below, mid + 1, lo)
+            hi = np.where(active & ~below, mid, hi)
+        pos = np.minimum(lo, len(self.successors) - 1)
+        found = (lo < end) & (self.successors[pos] == word_id)
+        result = np.where(found, self.counts[pos], 0)
+        if self.added_bigrams:
+            result += [self.added_bigrams.get(p, {}).get(word_id, 0) for p in prev_ids.tolist()]
+        return result
+
+    def log_denominator(self, prev_id) -> float:
+        if prev_id is None:
+            return self.log_unknown_denominator
+        if self.denominator_types == self.unigram_types:
+            return float(self.log_denominators[prev_id])
+        return math.log(int(self.unigram_counts[prev_id]) + self.unigram_types + 1)
+
+    def log_denominators_of(self, prev_ids: np.ndarray) -> np.ndarray:
+        """
+        log(count(p) + V + 1) for every p in prev_ids, negative IDs standing for unknown histories.
+        The precomputed denominators are used while V is the one they were computed for; once apply_counts
+        changed V, only the requested ones are computed.
+        """
+        safe = np.maximum(prev_ids, 0)
+        if self.denominator_types == self.unigram_types:
+            den = self.log_denominators[safe]
+        else:
+            den = np.log(self.unigram_counts[safe].astype(np.float64) + (self.unigram_types + 1))
+        return np.where(prev_ids >= 0, den, self.log_unknown_denominator)
+
+    def log_candidate_probabilities(self, prev_word: str, words: List[str]) -> np.ndarray:
+        """
+        log P(word | prev_word) for many candidate words.
+        """
+        prev_id = self.word_id(prev_word)
+        num = self.bigram_counts(prev_id, self.ids(words))
+        return np.log1p(num.astype(np.float64)) - self.log_denominator(prev_id)
+
+    def log_successor_probabilities(self, prev_words: List[str], word: str) -> np.ndarray:
+        """
+        log P(word | p) for many candidate histories p.
+        """
+        prev_ids = self.ids(prev_words)
+        num = self.row_counts(prev_ids, self.word_id(word))
+        return np.log1p(num.astype(np.float64)) - self.log_denominators_of(prev_ids)
+
+    def log_sentence_probability(self, sent) -> float:
+        """
+        Log-space counterpart of bigram_sentence_probability: the sum of log P(word | previous word).
+        """
+        words = sent.split() if isinstance(sent, str) else sent
+        if len(words) < 2:
+            return 0.0
+        prev_ids = self.ids(words[:-1])
+        word_ids = self.ids(words[1:])
+        num = np.array([self.bigram_count(p, w) for p, w in zip(prev_ids, word_ids)], dtype=np.float64)
+        return float(np.sum(np.log1p(num) - self.log_denominators_of(prev_ids)))
+
+    def bigram_count(self, prev_id: int, word_id: int) -> int:
+        if prev_id < 0 or word_id < 0:
+            return 0
+        return int(self.bigram_counts(prev_id, np.array([word_id], dtype=np.int64))[0])
+
+    def max_incoming_counts(self) -> np.ndarray:
+        """
+        Largest count of a bigram ending in each word ID. Counts removed by apply_counts are not subtracted,
+        so after removals this is an upper bound.
+        """
+        result = np.zeros(len(self.unigram_counts), dtype=np.int64)
+        np.maximum.at(result, self.successors.astype(np.intp), self.counts)
+        for prev_id, row in self.added_bigrams.items():
+            word_ids = np.fromiter(row, dtype=np.int64, count=len(row))
+            np.maximum.at(result, word_ids, self.bigram_counts(prev_id, word_ids))
+        return result
+
+    @metrics.timed('bigram_score_variants_seconds')
+    def score_variants(self, words: List[str], position: int, candidates: List[str]):
+        """
+        Score a sentence and every variant with words[position] replaced by a candidate, in one call.
+        Only the bigrams around the position differ, so each variant costs two vectorized lookups.
+        Return the log score of the sentence and an array of the log scores of the variants.
+        """
+        base = self.log_sentence_probability(words)
+        # Differences to the sentence are summed first, so a variant scoring the same as the sentence gets exactly base
+        delta = np.zeros(len(candidates))
+        if position > 0:
+            delta += self.log_candidate_probabilities(words[position - 1], candidates)
+            delta -= self.log_candidate_probabilities(words[position - 1], [words[position]])[0]
+        if position + 1 < len(words):
+            delta += self.log_successor_probabilities(candidates, words[position + 1])
+            delta -= self.log_successor_probabilities([words[position]], words[position + 1])[0]
+        return base, base + delta
+
+    def bigrams_of(self, word: str) -> Dict[Tuple[str, str], int]:
+        """
+        Every bigram with word as its previous or its next word, with its count.
+        """
+        word_id = self.word_id(word)
+        if word_id is None:
+            return {}
+
+        result = {}
+        start, end = int(self.row_offsets[word_id]), int(self.row_offsets[word_id + 1])
+        for successor, count in zip(self.successors[start:end].tolist(), self.counts[start:end].tolist()):
+            result[(word, self.word(successor))] = count
+        positions = np.flatnonzero(self.successors == word_id)
+        rows = np.searchsorted(self.row_offsets, positions, side='right') - 1
+        for prev_id, position in zip(rows.tolist(), positions.tolist()):
+            result[(self.word(prev_id), word)] = int(self.counts[position])
+        for prev_id, row in self.added_bigrams.items():
+            for successor, delta in row.items():
+                if prev_id == word_id or successor == word_id:
+                    key = (self.word(prev_id), self.word(successor))
+                    result[key] = result.get(key, 0) + delta
+        return {key: count for key, count in result.items() if count > 0}
+
+    def apply_counts(self, unigram_deltas: Dict[str, int], bigram_deltas: Dict[Tuple[str, str], int], unigram_types: int):
+        """
+        Add count deltas (negative to remove counts) and set the new number of word types V.
+        Only the entries of the changed words are written: the arrays are copied once into buffers owned by the
+        model, which grow geometrically, and the precomputed denominators are kept for the V they were computed
+        for. The arrays cover new words before their IDs are handed out, so a reader on another thread never
+        gets an ID past the end of an array.
+        """
+        words = dict.fromkeys(unigram_deltas)
+        for key in bigram_deltas:
+            words.update(dict.fromkeys(key))
+        new_words = [w for w in words if self.word_id(w) is None]
+        size = len(self.unigram_counts) + len(new_words)
+        unigram_counts, row_offsets, log_denominators = self._reserve(size)
+        self.row_offsets = row_offsets[:size + 1]
+        self.log_denominators = log_denominators[:size]
+        self.unigram_counts = unigram_counts[:size]
+        for w in new_words:
+            self.added_words.append(w)
+            self.added_ids[w] = self.base_size + len(self.added_words) - 1
+
+        changed = [self.word_id(w) for w in unigram_deltas]
+        for word_id, delta in zip(changed, unigram_deltas.values()):
+            unigram_counts[word_id] += delta
+        changed = np.array(changed, dtype=np.int64)
+        log_denominators[changed] = np.log(unigram_counts[changed].astype(np.float64) + (self.denominator_types + 1))
+        for (prev_word, word), delta in bigram_deltas.items():
+            row = self.added_bigrams.setdefault(self.word_id(prev_word), {})
+            word_id = self.word_id(word)
+            row[word_id] = row.get(word_id, 0) + delta
+
+        self.unigram_types = unigram_types
+        self.log_unknown_denominator = math.log(unigram_types + 1)
+
+    def _reserve(self, size: int):
+        """
+        Buffers with room for size words, copied from the current arrays when there are none yet or they are full.
+        """
+        if self._buffers is not None and len(self._buffers[0]) >= size:
+            return self._buffers
+        current = len(self.unigram_counts)
+        capacity = size + size // 2
+        unigram_counts = np.zeros(capacity, dtype=np.int64)
+        unigram_counts[:current] = self.unigram_counts
+        # Words without bigram rows in the CSR table have empty rows at its end
+        row_offsets = np.full(capacity + 1, len(self.successors), dtype=np.int64)
+        row_offsets[:current + 1] = self.row_offsets
+        log_denominators = np.full(capacity, math.log(self.denominator_types + 1))
+        log_denominators[:current] = self.log_denominators
+        self._buffers = (unigram_counts, row_offsets, log_denominators)
+        return self._buffers
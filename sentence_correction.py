@@ -0,0 +1,178 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+    Jurafsky and Martin, Speech and Language Processing, Chapter 8 (Viterbi decoding) and Appendix B (noisy channel)
+"""
+
+import sys
+import json
+import argparse
+
+from typing import Dict, List, Sequence, Tuple
+
+import non_word_checking
+from spell_engine import SpellCheckEngine
+
+
+"""
+Part 1: Candidate Lattice
+"""
+class SentenceCorrector:
+    """
+    Corrects a whole sentence in one pass instead of one window at a time.
+    Every token gets a column of candidates: the non-word suggestions of a misspelled word, or a correct word
+    with its real-word neighbours (the candidates of check_context). A beam search over the columns finds the
+    sequence with the best score under the speller's context model, from '<SOS>' to '<EOS>'.
+    Paths ending in the same history are merged as in Viterbi decoding, so beam_width=None is exact.
+    """
+    def __init__(self, speller: SpellCheckEngine, beam_width: int = 8, max_candidates: int = 16,
+                 edit_penalty: float = 0.0, max_alternatives: int = 5):
+        self.speller = speller
+        self.beam_width = beam_width
+        # Candidates kept per token, the most frequent first
+        self.max_candidates = max_candidates
+        # Log score subtracted per edit; 0 replaces a word whenever a candidate fits better, like check_context
+        self.edit_penalty = edit_penalty
+        self.max_alternatives = max_alternatives
+        self.history = speller.context_order - 1
+
+    def candidates(self, word: str) -> Tuple[str, List[Tuple[str, int]]]:
+        """
+        Return the error type of word (None, 'non-word' or 'real-word' candidates) and its (candidate, MED) column.
+        """
+        word = word.lower()
+        unigrams = self.speller.freq_dict_unigram_context
+
+        if not self.speller.check(word):
+            column = [(label.split()[0], med) for label, med in self.speller.suggestions(word).items()]
+            column.sort(key=lambda item: (item[1], -unigrams.get(item[0], 0), item[0]))
+            # A word without suggestions stays as it is
+            return 'non-word', column[:self.max_candidates] or [(word, 0)]
+
+        neighbours = self.speller.context_candidates(word)
+        neighbours.sort(key=lambda w: (-unigrams.get(w, 0), w))
+        neighbours = neighbours[:self.max_candidates - 1]
+        meds = non_word_checking.cal_med_batch(word, neighbours)
+        return 'real-word', [(word, 0)] + list(zip(neighbours, meds))
+
+    def scores(self, history: Sequence[str], words: List[str]) -> List[float]:
+        """
+        Log score of each word after the history, under the speller's context model.
+        """
+        if self.speller.ngram_model is not None:
+            return self.speller.ngram_model.candidate_scores(history, words)
+        return self.speller.bigram_model.log_candidate_probabilities(history[-1], words).tolist()
+
+    # Beam search
+    def decode(self, columns: List[List[Tuple[str, int]]]) -> Tuple[float, List[int]]:
+        """
+        Return the best score and the index of the chosen candidate in every column.
+        """
+        # History tuple -> (score, back pointer); a back pointer is (previous history, candidate index)
+        beam = {('<SOS>',): (0.0, None)}
+        back = []
+        for column in columns:
+            words = [candidate for candidate, _ in column]
+            penalties = [self.edit_penalty * med for _, med in column]
+            expanded = {}
+            for history, (score, _) in beam.items():
+                for j, (word, word_score) in enumerate(zip(words, self.scores(history, words))):
+                    total = score + word_score - penalties[j]
+                    state = (history + (word,))[-self.history:]
+                    if state not in expanded or total > expanded[state][0]:
+                        expanded[state] = (total, (history, j))
+            if self.beam_width is not None and len(expanded) > self.beam_width:
+                kept = sorted(expanded.items(), key=lambda item: -item[1][0])[:self.beam_width]
+                expanded = dict(kept)
+            back.append(expanded)
+            beam = expanded
+
+        best_state, best_score = None, float('-inf')
+        for history, (score, _) in beam.items():
+            total = score + self.scores(history, ['<EOS>'])[0]
+            if total > best_score:
+                best_state, best_score = history, total
+
+        path = []
+        state = best_state
+        for step in reversed(back):
+            state, j = step[state][1]
+            path.append(j)
+        path.reverse()
+        return best_score, path
+
+    # Per-token alternatives
+    def local_score(self, words: List[str], position: int, penalties: List[float]) -> float:
+        """
+        Score of the terms of '<SOS> words <EOS>' that depend on words[position].
+        """
+        padded = ['<SOS>'] + words + ['<EOS>']
+        total = -penalties[position]
+        for i in range(position + 1, min(position + 1 + self.history, len(padded) - 1) + 1):
+            total += self.scores(padded[max(0, i - self.history):i], [padded[i]])[0]
+        return total
+
+    def correct(self, text: str) -> Dict:
+        """
+        Correct one sentence. The result holds the corrected text, its score and, for every token,
+        its correction and up to max_alternatives candidates with the score of the sentence using them.
+        """
+        matches = [(m.start(), m.end(), m.group()) for m in non_word_checking.wordRegEx.finditer(text)]
+        types, columns = [], []
+        for _, _, word in matches:
+            kind, column = self.candidates(word)
+            types.append(kind)
+            columns.append(column)
+
+        score, path = self.decode(columns)
+        best = [columns[i][j][0] for i, j in enumerate(path)]
+        penalties = [self.edit_penalty * columns[i][j][1] for i, j in enumerate(path)]
+
+        tokens = []
+        corrected = text
+        for i, (start, end, word) in reversed(list(enumerate(matches))):
+            # Only the terms around token i change when it is swapped for another candidate
+            base = score - self.local_score(best, i, penalties)
+            alternatives = []
+            for candidate, med in columns[i]:
+                words = best[:i] + [candidate] + best[i + 1:]
+                swapped = penalties[:i] + [self.edit_penalty * med] + penalties[i + 1:]
+                alternatives.append({'word': candidate, 'score': base + self.local_score(words, i, swapped)})
+            alternatives.sort(key=lambda item: (-item['score'], item['word']))
+
+            correction = best[i]
+            changed = correction != word.lower()
+            if changed:
+                corrected = corrected[:start] + correction + corrected[end:]
+            tokens.append({'start': start, 'end': end, 'word': word, 'correction': correction,
+                           'type': types[i] if changed or types[i] == 'non-word' else None,
+                           'alternatives': alternatives[:self.max_alternatives]})
+        tokens.reverse()
+
+        return {'text': text, 'corrected': corrected, 'score': score, 'tokens': tokens}
+
+
+def correct_sentence(speller: SpellCheckEngine, text: str, beam_width: int = 8) -> Dict:
+    return SentenceCorrector(speller, beam_width).correct(text)
+
+
+"""
+Part 2: Command Line Interface
+"""
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Correct every line of standard input as one sentence and print JSON lines.')
+    parser.add_argument('--beam-width', type=int, default=8, help='histories kept per token; 0 for exact Viterbi')
+    parser.add_argument('--edit-penalty', type=float, default=0.0, help='log score subtracted per edit')
+    parser.add_argument('--corpus', default='./data/*.txt', help='corpus files of the language model')
+    parser.add_argument('--snapshot', default='./data/model.snapshot', help='compiled language model snapshot')
+    parser.add_argument('--context-model', default='laplace', choices=['laplace', 'stupid_backoff', 'kneser_ney'])
+    parser.add_argument('--order', type=int, default=3, help='n-gram order of the stupid_backoff and kneser_ney models')
+    args = parser.parse_args()
+
+    engine = SpellCheckEngine(args.corpus, args.snapshot, context_model=args.context_model, order=args.order)
+    corrector = SentenceCorrector(engine, args.beam_width or None, edit_penalty=args.edit_penalty)
+    for line in sys.stdin:
+        if line.strip():
+            sys.stdout.write(json.dumps(corrector.correct(line.rstrip('\n'))) + '\n')
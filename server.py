@@ -0,0 +1,351 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import os
+import json
+import asyncio
+import argparse
+
+from typing import Awaitable, Callable, Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from batch_check import BatchChecker
+import metrics
+from spell_engine import SpellCheckEngine
+
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1 << 20
+
+
+"""
+Part 1: Worker Processes
+"""
+# BatchChecker of this process, created by init_worker
+_checker = None
+
+
+def init_worker(file_dir: str, snapshot_path: str, context_model: str, order: int, model: str = 'full',
+                compressed_path: str = None):
+    """
+    Load the model of a worker. Forked workers inherit the model of the server process and skip loading;
+    the snapshot is memory-mapped, so its pages are shared by every process either way.
+    """
+    global _checker
+    if _checker is None:
+        _checker = BatchChecker(SpellCheckEngine(file_dir, snapshot_path, context_model=context_model, order=order,
+                                                 model=model, compressed_path=compressed_path))
+        _checker.speller.check('the')
+
+
+def run_words(words: List[str]) -> Dict:
+    return _checker.check_words(words)
+
+
+def run_windows(windows: List[Tuple[str, ...]]) -> Dict:
+    return _checker.check_windows(windows)
+
+
+def run_documents(documents: List[Tuple[str, str]]) -> List[Dict]:
+    return _checker.check_batch(documents)
+
+
+"""
+Part 2: Micro-batching
+"""
+class Overloaded(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects the items submitted by concurrent requests and processes them together.
+    A batch is dispatched once max_batch items are queued or max_delay seconds after its first item arrived.
+    At most max_in_flight batches run at a time; while they do, items queue up, and once max_pending items
+    are waiting, submit raises Overloaded instead of queueing more work.
+    """
+    def __init__(self, process: Callable[[List], Awaitable[List]], max_batch: int = 256, max_delay: float = 0.002,
+                 max_pending: int = 4096, max_in_flight: int = 2):
+        # Coroutine function mapping a list of items to the list of their results
+        self.process = process
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.queue = []
+        self.pending = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def submit(self, item):
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((item, future))
+        self.pending += 1
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        self.wakeup.set()
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if not self.queue:
+                continue
+            if len(self.queue) < self.max_batch:
+                await asyncio.sleep(self.max_delay)
+            await self.in_flight.acquire()
+            batch, self.queue = self.queue[:self.max_batch], self.queue[self.max_batch:]
+            if self.queue:
+                self.wakeup.set()
+            asyncio.ensure_future(self.dispatch(batch))
+
+    async def dispatch(self, batch: List):
+        try:
+            results = await self.process([item for item, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self.in_flight.release()
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+"""
+Part 3: Service
+"""
+class SpellCheckServer:
+    """
+    HTTP/JSON spell checking service. Requests are micro-batched per endpoint, every batch is deduplicated
+    and split across a process pool (processes=0 runs batches on one thread of the server process instead).
+    """
+    def __init__(self, file_dir: str = './data/*.txt', snapshot_path: str = './data/model.snapshot',
+                 context_model: str = 'laplace', order: int = 3, processes: int = None,
+                 max_batch: int = 256, max_delay: float = 0.002, max_pending: int = 4096, model: str = 'full',
+                 compressed_path: str = None):
+        self.model_args = (file_dir, snapshot_path, context_model, order, model, compressed_path)
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.batcher_args = (max_batch, max_delay, max_pending, max(1, self.processes))
+        self.executor = None
+        self.server = None
+        self.endpoints = {
+            '/check': self.check,
+            '/suggestions': self.suggestions,
+            '/check_context': self.check_context,
+            '/suggestions_context': self.suggestions_context,
+            '/check_batch': self.check_batch,
+        }
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765):
+        # Load the model (and write its snapshot) once, before any worker exists
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, init_worker, *self.model_args)
+        if self.processes == 0:
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            self.executor = ProcessPoolExecutor(self.processes, initializer=init_worker, initargs=self.model_args)
+            # The first task starts every worker. Forked before the socket exists, workers hold no copies of
+            # client connections, which would keep them open after the server closes them.
+            await loop.run_in_executor(self.executor, init_worker, *self.model_args)
+
+        self.words = MicroBatcher(self.process_words, *self.batcher_args)
+        self.windows = MicroBatcher(self.process_windows, *self.batcher_args)
+        self.documents = MicroBatcher(self.process_documents, *self.batcher_args)
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            for batcher in (self.words, self.windows, self.documents):
+                batcher.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def chunks(self, items: List) -> List[List]:
+        count = max(1, min(self.processes, len(items)))
+        return [items[i::count] for i in range(count)]
+
+    async def run_chunks(self, function: Callable, items: List) -> List:
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(self.executor, function, chunk) for chunk in self.chunks(items)))
+
+    async def process_words(self, words: List[str]) -> List:
+        verdicts = {}
+        for part in await self.run_chunks(run_words, list(set(words))):
+            verdicts.update(part)
+        return [verdicts[word] for word in words]
+
+    async def process_windows(self, windows: List[Tuple[str, ...]]) -> List:
+        verdicts = {}
+        for part in await self.run_chunks(run_windows, list(set(windows))):
+            verdicts.update(part)
+        return [verdicts[window] for window in windows]
+
+    async def process_documents(self, documents: List[Tuple[str, str]]) -> List[Dict]:
+        count = max(1, min(self.processes, len(documents)))
+        parts = await self.run_chunks(run_documents, documents)
+        # Chunk i holds documents i, i + count, ...
+        results = [None] * len(documents)
+        for i, part in enumerate(parts):
+            results[i::count] = part
+        return results
+
+    # Endpoints
+    @staticmethod
+    def field(request: Dict, name: str) -> str:
+        value = request[name]
+        if not isinstance(value, str):
+            raise TypeError(name + ' must be a string')
+        return value
+
+    async def check(self, request: Dict) -> Dict:
+        return {'correct': await self.words.submit(self.field(request, 'word')) is None}
+
+    async def suggestions(self, request: Dict) -> Dict:
+        return {'suggestions': await self.words.submit(self.field(request, 'word')) or []}
+
+    async def context_verdict(self, request: Dict):
+        window = tuple(self.field(request, 'text').split())
+        if len(window) < 2:
+            return None
+        return await self.windows.submit(window)
+
+    async def check_context(self, request: Dict) -> Dict:
+        return {'correct': await self.context_verdict(request) is None}
+
+    async def suggestions_context(self, request: Dict) -> Dict:
+        return {'suggestions': await self.context_verdict(request) or []}
+
+    async def check_batch(self, request: Dict) -> Dict:
+        documents = [(document.get('id'), self.field(document, 'text')) for document in request['documents']]
+        return {'results': await asyncio.gather(*(self.documents.submit(document) for document in documents))}
+
+    # HTTP
+    async def route(self, method: str, path: str, body: bytes):
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok'}
+        if method == 'GET' and path == '/metrics':
+            return 200, metrics.prometheus_text()
+
+        handler = self.endpoints.get(path)
+        if handler is None:
+            return 404, {'error': 'unknown endpoint ' + path}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, {'error': 'body is not JSON'}
+        try:
+            return 200, await handler(request)
+        except (KeyError, TypeError, AttributeError) as error:
+            return 400, {'error': 'bad request: ' + str(error)}
+        except Overloaded:
+            return 503, {'error': 'overloaded, retry later'}
+        except Exception as error:
+            return 500, {'error': '%s: %s' % (type(error).__name__, error)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'bad request line'}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.route(method, path.split('?')[0], body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload).encode(), 'application/json'
+        head = ['HTTP/1.1 %d %s' % (status, reasons[status]), 'Content-Type: ' + content_type,
+                'Content-Length: %d' % len(body), 'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+        if status == 503:
+            head.append('Retry-After: 1')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, **kwargs):
+    server = SpellCheckServer(**kwargs)
+    await server.start(host, port)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the spell checker over HTTP/JSON on a local port.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=None, help='worker processes; 0 checks on a thread of the server')
+    parser.add_argument('--max-batch', type=int, default=256, help='items checked together per endpoint')
+    parser.add_argument('--max-delay', type=float, default=0.002, help='seconds a batch waits for more items')
+    parser.add_argument('--max-pending', type=int, default=4096, help='queued items per endpoint before answering 503')
+    parser.add_argument('--corpus', default='./data/*.txt', help='corpus files of the language model')
+    parser.add_argument('--snapshot', default='./data/model.snapshot', help='compiled language model snapshot')
+    parser.add_argument('--context-model', default='laplace', choices=['laplace', 'stupid_backoff', 'kneser_ney'])
+    parser.add_argument('--order', type=int, default=3, help='n-gram order of the stupid_backoff and kneser_ney models')
+    parser.add_argument('--model', default='full', choices=['full', 'compressed'],
+                        help='compressed serves the laplace model from a compressed_model file, for low-memory workers')
+    parser.add_argument('--compressed', help='compressed model file; model.snapshot.compressed next to the snapshot by default')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, file_dir=args.corpus, snapshot_path=args.snapshot,
+                          context_model=args.context_model, order=args.order, processes=args.processes,
+                          max_batch=args.max_batch, max_delay=args.max_delay, max_pending=args.max_pending,
+                          model=args.model, compressed_path=args.compressed))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,602 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import math
+import heapq
+import threading
+
+from typing import List, Tuple
+from operator import itemgetter
+
+import candidate_index
+import compressed_model
+from lru_cache import LRUCache
+import metrics
+import model_builder
+import model_snapshot
+import model_updates
+import ngram_model
+import non_word_checking
+import real_word_checking
+
+
+class SpellCheckEngine:
+    """
+    Pure-Python spell checking engine. It does not depend on Qt, so it can be used by headless services;
+    SpellCheckWrapper adapts it for the GUI.
+    """
+    def __init__(self, file_dir: str = './data/*.txt', snapshot_path: str = './data/model.snapshot', cache_size: int = 4096,
+                 context_model: str = 'laplace', order: int = 3, candidate_backend: str = None, model: str = 'full',
+                 compressed_path: str = None):
+        self.alphabet = set(candidate_index.ALPHABET)
+
+        # Language model: the count tables of the snapshot ('full'), or for memory-constrained workers a read-only
+        # compressed_model.CompressedBigramModel ('compressed'), read from compressed_path
+        if model not in ('full', 'compressed'):
+            raise ValueError('Unknown model: ' + model)
+        if model == 'compressed' and context_model != 'laplace':
+            raise ValueError('The compressed model only supports the laplace context model')
+        self.model = model
+        self.compressed_path = compressed_path or snapshot_path + '.compressed'
+
+        # Candidate generation: the fast candidate_index.DeletionIndex ('deletion'), or the much smaller
+        # candidate_index.VocabularyTrie ('trie'), which is slower to search. The compressed model uses the trie
+        # unless told otherwise, since the deletion index would outweigh the model itself
+        if candidate_backend is None:
+            candidate_backend = 'trie' if model == 'compressed' else 'deletion'
+        if candidate_backend not in ('deletion', 'trie'):
+            raise ValueError('Unknown candidate backend: ' + candidate_backend)
+        self.candidate_backend = candidate_backend
+
+        # Real-word scoring: the add-one smoothed bigram model ('laplace'), or an order-N
+        # ngram_model.NGramModel with 'stupid_backoff' or 'kneser_ney' smoothing
+        if context_model not in ('laplace', 'stupid_backoff', 'kneser_ney'):
+            raise ValueError('Unknown context model: ' + context_model)
+        self.context_model = context_model
+        # Laplace windows can be accepted from the bigram counts alone, which the compressed model does not keep
+        self._use_fast_accept = context_model == 'laplace' and model == 'full'
+        # A context window holds the checked word and at least one word before it
+        if order < 2:
+            raise ValueError('Context model order must be at least 2')
+        self.order = order
+
+        # Non-word verdicts and suggestions per word, real-word suggestions per (previous word, word) window
+        self.non_word_cache = LRUCache(cache_size)
+        self.context_cache = LRUCache(cache_size)
+
+        # Corpus files and the compiled language model built from them
+        self.file_dir = file_dir
+        self.snapshot_path = snapshot_path
+        self._model_loaded = False
+        # Held while the model is built, updated or read: the highlighter checks from a worker thread while the
+        # GUI thread may add words. Reentrant, since checks load the model on first use.
+        self._model_lock = threading.RLock()
+
+        # Online updates are appended to a log next to the snapshot and folded into it every compact_after updates.
+        # generation counts the updates, so holders of cached verdicts (the highlighter) know when to drop them.
+        self.update_log_path = snapshot_path + '.log'
+        # Counts of the stupid_backoff and kneser_ney models, which the snapshot does not hold
+        self.ngram_path = '%s.ngram%d' % (snapshot_path, order)
+        self.compact_after = 1000
+        self.generation = 0
+        self._totals = None
+        self._bounds = None
+        self._compaction = None
+
+        # Cache hit rates are reported by metrics.snapshot() and metrics.prometheus_text()
+        metrics.register_collector(self._cache_gauges)
+
+    @property
+    def freq_dict_unigram(self):
+        self._load_model()
+        return self._freq_dict_unigram
+
+    @property
+    def freq_dict_unigram_context(self):
+        self._load_model()
+        return self._freq_dict_unigram_context
+
+    @property
+    def freq_dict_bigram_context(self):
+        self._load_model()
+        return self._freq_dict_bigram_context
+
+    @property
+    def bigram_model(self):
+        self._load_model()
+        return self._bigram_model
+
+    @property
+    def ngram_model(self):
+        self._load_model()
+        return self._ngram_model
+
+    @property
+    def context_order(self) -> int:
+        """
+        Number of words in the windows passed to check_context and suggestions_context: the checked word
+        and the words before it that the context model looks at.
+        """
+        return 2 if self.context_model == 'laplace' else self.order
+
+    @property
+    def candidate_index(self):
+        self._load_model()
+        return self._candidate_index
+
+    @property
+    def confusion_table(self):
+        self._load_model()
+        return self._confusion_table
+
+    def _load_model(self):
+        """
+        Load the language models on first use.
+        The memory-mapped snapshot is preferred; the corpus is only parsed when the snapshot is missing or stale.
+        """
+        if self._model_loaded:
+            return
+
+        # The highlighter may check from a worker thread while the GUI thread also needs the model
+        with self._model_lock:
+            if not self._model_loaded:
+                self._build_model()
+
+    def _build_model(self):
+        self.clear_caches()
+        if self.model == 'compressed':
+            self._build_compressed_model()
+            self._model_loaded = True
+            return
+
+        sentences = None
+        if not self._load_snapshot():
+            sentences = self._build_from_corpus()
+
+        # Non-word checks and the context model share one unigram table
+        self._freq_dict_unigram = self._freq_dict_unigram_context = model_updates.CountOverlay(self._freq_dict_unigram_context)
+        self._freq_dict_bigram_context = model_updates.CountOverlay(self._freq_dict_bigram_context)
+        self._build_candidate_index()
+        self._build_confusion_table()
+        if sentences is not None:
+            # Compile the snapshot so the next start can skip corpus parsing
+            try:
+                model_snapshot.write_snapshot(self.snapshot_path, self._freq_dict_unigram_context, self._freq_dict_bigram_context,
+                                              confusion_sets=self._confusion_sets())
+            except OSError:
+                pass
+        self.update_log = model_updates.UpdateLog(self.update_log_path)
+
+        self._ngram_model = None if self.context_model == 'laplace' else self._load_ngram_model(sentences)
+
+        # Updates made after the snapshot was written
+        for entry in self.update_log.entries(self._snapshot_sequence):
+            self._apply_update(entry)
+
+        self._model_loaded = True
+
+    def _build_compressed_model(self):
+        """
+        The compressed model is read from its file while it is newer than the corpus, and compressed from the
+        corpus counts (and saved) otherwise. Its vocabulary takes the place of the unigram table: non-word checks,
+        the candidate index and the confusion table are built over it. Logged updates are not applied.
+        """
+        model = None
+        if model_snapshot.is_snapshot_fresh(self.compressed_path, self.file_dir):
+            try:
+                model = compressed_model.CompressedBigramModel.load(self.compressed_path)
+            except (OSError, ValueError, KeyError):
+                model = None
+        if model is None:
+            # Every bigram is kept: most are seen once, and pruning them misses many real-word errors
+            freq_dict_unigram, freq_dict_bigram = model_builder.build_model(self.file_dir).tables()
+            model = compressed_model.CompressedBigramModel.build(freq_dict_unigram, freq_dict_bigram, min_count=1)
+
+        self._freq_dict_unigram = self._bigram_model = model
+        self._freq_dict_unigram_context = self._freq_dict_bigram_context = None
+        self._ngram_model = None
+        self._confusion_rows = model.confusion_rows
+        self._build_candidate_index()
+        self._build_confusion_table()
+        if model.confusion_rows is None:
+            # Saved with the confusion table, which is slow to compute over the trie
+            model.confusion_rows = (self._confusion_table.offsets, self._confusion_table.ids)
+            try:
+                model.save(self.compressed_path)
+            except OSError:
+                pass
+
+    def _load_snapshot(self) -> bool:
+        if not model_snapshot.is_snapshot_fresh(self.snapshot_path, self.file_dir):
+            return False
+        try:
+            snapshot = model_snapshot.LanguageModelSnapshot(self.snapshot_path)
+        except (OSError, ValueError):
+            return False
+
+        self._freq_dict_unigram = snapshot.unigrams
+        self._freq_dict_unigram_context, self._freq_dict_bigram_context = snapshot.unigrams, snapshot.bigrams
+        self._bigram_model = real_word_checking.CompactBigramModel.from_snapshot(snapshot)
+        self._confusion_rows = (snapshot.confusion_offsets, snapshot.confusion_ids) if snapshot.confusion_ids is not None else None
+        self._snapshot_sequence = snapshot.log_sequence
+        return True
+
+    def _load_ngram_model(self, sentences: List[str] = None):
+        """
+        The order-N counts are kept in their own file next to the snapshot. They are read from it while it is
+        newer than the corpus, and counted from the corpus otherwise; documents added up to the snapshot's
+        last update but after the file was written are counted in, and the file is rewritten.
+        """
+        model, sequence = None, 0
+        if sentences is None and model_snapshot.is_snapshot_fresh(self.ngram_path, self.file_dir):
+            try:
+                model, sequence = ngram_model.NGramModel.load(self.ngram_path, self.context_model)
+            except (OSError, ValueError, KeyError):
+                model = None
+        counted = model is None or model.order != self.order or sequence > self._snapshot_sequence
+        if counted:
+            if sentences is None:
+                sentences = non_word_checking.get_tokens(self.file_dir)[1]
+            model, sequence = ngram_model.NGramModel(self.order, self.context_model), 0
+            for sentence in sentences:
+                model.add_sentence(sentence.split())
+            model.precompute()
+
+        added = [sentence for entry in self.update_log.entries(sequence)
+                 if entry['seq'] <= self._snapshot_sequence and entry['op'] == 'add_text'
+                 for sentence in model_updates.count_text(entry['text'])[2]]
+        for sentence in added:
+            model.add_sentence(sentence.split())
+        if counted or added:
+            try:
+                model.save(self.ngram_path, self._snapshot_sequence)
+            except OSError:
+                pass
+        return model
+
+    def _build_from_corpus(self) -> List[str]:
+        # Unigram and bigram tables counted in one pass over the corpus; the sentences are only
+        # kept for the higher-order models
+        counts = model_builder.build_model(self.file_dir, keep_sentences=self.context_model != 'laplace')
+        freq_dict_unigram, freq_dict_bigram = counts.tables()
+
+        self._freq_dict_unigram = self._freq_dict_unigram_context = freq_dict_unigram
+        self._freq_dict_bigram_context = freq_dict_bigram
+        self._bigram_model = real_word_checking.CompactBigramModel.from_dicts(freq_dict_unigram, freq_dict_bigram)
+        self._confusion_rows = None
+        self._snapshot_sequence = 0
+
+        return counts.sentences if counts.sentences is not None else []
+
+    # Online updates
+    def add_text(self, text: str):
+        """
+        Count the words and sentences of a document into the model, as if it were part of the corpus.
+        """
+        self._update({'op': 'add_text', 'text': text})
+
+    def add_word(self, word: str, count: int = 1):
+        """
+        Add a word to the vocabulary, e.g. from a custom dictionary, or raise its count.
+        """
+        self._update({'op': 'add_word', 'word': word.lower(), 'count': count})
+
+    def remove_word(self, word: str):
+        """
+        Remove a word and every bigram it occurs in from the model, so it is reported as a non-word.
+        """
+        self._update({'op': 'remove_word', 'word': word.lower()})
+
+    def _update(self, entry: dict):
+        if self.model == 'compressed':
+            raise ValueError('The compressed model is read-only')
+        self._load_model()
+        with self._model_lock:
+            self._apply_update(entry)
+            self.update_log.append(entry)
+            pending = self.update_log.sequence - self._snapshot_sequence
+        if pending >= self.compact_after:
+            self.compact_updates()
+
+    def _apply_update(self, entry: dict):
+        """
+        Turn an update log entry into count deltas and apply them to every table, index and normalizer.
+        """
+        sentences = []
+        if entry['op'] == 'add_text':
+            unigrams, bigrams, sentences = model_updates.count_text(entry['text'])
+        elif entry['op'] == 'add_word':
+            unigrams, bigrams = {entry['word']: entry['count']}, {}
+        elif entry['op'] == 'remove_word':
+            unigrams = {entry['word']: -self._freq_dict_unigram.get(entry['word'], 0)}
+            bigrams = {key: -count for key, count in self._bigram_model.bigrams_of(entry['word']).items()}
+        else:
+            raise ValueError('Unknown update: ' + entry['op'])
+
+        for word, delta in unigrams.items():
+            present = word in self._freq_dict_unigram
+            self._freq_dict_unigram.add(word, delta)
+            if word in self._freq_dict_unigram and not present:
+                self._candidate_index.add(word)
+                self._confusion_table.update(word)
+            elif present and word not in self._freq_dict_unigram:
+                self._candidate_index.remove(word)
+                self._confusion_table.update(word)
+        for key, delta in bigrams.items():
+            self._freq_dict_bigram_context.add(key, delta)
+        self._bigram_model.apply_counts(unigrams, bigrams, len(self._freq_dict_unigram_context))
+
+        # NGramModel only supports adding sentences; it updates its smoothing tables as they are added
+        if self._ngram_model is not None:
+            for sentence in sentences:
+                self._ngram_model.add_sentence(sentence.split())
+
+        self.clear_caches()
+        self.generation += 1
+
+    def compact_updates(self, background: bool = True):
+        """
+        Write the current counts into the snapshot, so the logged updates need not be replayed on the next load.
+        The log itself is kept: it is replayed in full whenever the snapshot is rebuilt from the corpus.
+        """
+        if self.model == 'compressed':
+            return
+        if self._compaction is None or not self._compaction.is_alive():
+            self._compaction = threading.Thread(target=self._compact, daemon=True)
+            self._compaction.start()
+        if not background:
+            self._compaction.join()
+
+    def _compact(self):
+        with self._model_lock:
+            freq_dict_unigram = dict(self._freq_dict_unigram_context.items())
+            freq_dict_bigram = dict(self._freq_dict_bigram_context.items())
+            confusion_sets = self._confusion_sets()
+            sequence = self.update_log.sequence
+        try:
+            model_snapshot.write_snapshot(self.snapshot_path, freq_dict_unigram, freq_dict_bigram, sequence, confusion_sets)
+        except OSError:
+            return
+        self._snapshot_sequence = sequence
+
+    def _build_candidate_index(self):
+        # Deletion index or trie over the vocabulary, covering edit distances 1 and 2
+        if self.candidate_backend == 'trie':
+            self._candidate_index = candidate_index.VocabularyTrie(self._freq_dict_unigram, self.alphabet)
+        else:
+            self._candidate_index = candidate_index.DeletionIndex(self._freq_dict_unigram, 2, self.alphabet)
+
+    def _build_confusion_table(self):
+        # Stored in snapshots since version 3; otherwise computed from the candidate index
+        model = self._bigram_model
+        rows = self._confusion_rows
+        if rows is None:
+            rows = candidate_index.ConfusionTable.rows(self._candidate_index, list(self._freq_dict_unigram), model.word_id, model.base_size)
+        self._confusion_table = candidate_index.ConfusionTable(self._candidate_index, *rows, model.word_id, model.word)
+
+    def _confusion_sets(self) -> dict:
+        return {word: self._confusion_table.candidates(word) for word in self._freq_dict_unigram}
+
+    def context_candidates(self, word: str) -> List[str]:
+        """
+        In-vocabulary words one edit away from word, or two edits away when there are none,
+        looked up in the confusion table for vocabulary words. These are the real-word candidates of check_context.
+        """
+        with self._model_lock:
+            word_id = self.bigram_model.word_id(word)
+            if word_id is None or not self._in_vocabulary(word_id):
+                return candidate_index.confusion_set(self.candidate_index, word)
+            return self.confusion_table.candidates(word, word_id)
+
+    def _in_vocabulary(self, word_id: int) -> bool:
+        # Words that only occur in bigrams (<SOS>, <EOS>) or were removed by updates have an ID but no count
+        if self.model == 'compressed':
+            return bool(self.bigram_model.known[word_id])
+        return self.bigram_model.unigram_counts[word_id] > 0
+
+    def _spell_check(self, word: str):
+        # spell_checker lower-cases the word first, so its verdict only depends on the lower-cased word
+        key = word.lower()
+        with self._model_lock:
+            result = self.non_word_cache.get(key)
+            if result is None:
+                result = non_word_checking.spell_checker(word, self.alphabet, self.freq_dict_unigram, need_2_med=True, candidate_index=self.candidate_index)
+                self.non_word_cache.put(key, result)
+        return result
+
+    def _context_scores(self, word: str) -> Tuple[List[str], float, List[float]]:
+        """
+        The last word of the window is checked, and every earlier word (up to order - 1 of them) is its history.
+        Return its candidates, the log score of the window and the log score of the window with its last word
+        replaced by each candidate.
+        """
+        words = word.split()
+        suggestion_list = self.context_candidates(words[-1])
+        if self.ngram_model is not None:
+            score = self.ngram_model.score(words[-1], words[:-1])
+            scores = self.ngram_model.candidate_scores(words[:-1], suggestion_list)
+        else:
+            score, scores = self.bigram_model.score_variants(words, len(words) - 1, suggestion_list)
+        if metrics.enabled:
+            metrics.observe('context_candidates', len(suggestion_list))
+        return suggestion_list, score, scores
+
+    def _accept_bounds(self):
+        # Largest count of a bigram ending in a confusable of each word ID, computed once per generation of the model
+        if self._bounds is None or self._bounds[0] != self.generation:
+            self._bounds = (self.generation, self.confusion_table.bounds(self.bigram_model.max_incoming_counts()))
+        return self._bounds[1]
+
+    def _fast_accept(self, words: List[str]) -> bool:
+        """
+        Under the laplace model a candidate only scores higher than the last word of a window when its bigram with
+        the previous word is more frequent. So no candidate needs scoring when the bigram of the word is at least
+        as frequent as any bigram ending in one of its confusables, or when the previous word is unknown and
+        every candidate ties with the word.
+        """
+        prev_id, word_id = self.bigram_model.ids(words[-2:]).tolist()
+        if prev_id < 0:
+            return True
+        # Words outside the vocabulary have no confusion set in the table
+        if word_id < 0 or not self._in_vocabulary(word_id):
+            return False
+        return self.bigram_model.bigram_count(prev_id, word_id) >= self._accept_bounds()[word_id]
+
+    def _context_suggestions(self, word: str) -> List[str]:
+        with self._model_lock:
+            result = self.context_cache.get(word)
+            if result is not None:
+                return result
+
+            if self._use_fast_accept and self._fast_accept(word.split()):
+                if metrics.enabled:
+                    metrics.counter('context_fast_accepts_total').inc()
+                self.context_cache.put(word, [])
+                return []
+
+            suggestion_list, score, scores = self._context_scores(word)
+            real_suggestion_list = [i + ' (Real-word Error)' for i, score_temp in zip(suggestion_list, scores) if score < score_temp]
+
+            self.context_cache.put(word, real_suggestion_list)
+            return real_suggestion_list
+
+    def _unigram_totals(self) -> Tuple[int, int]:
+        # Sum and maximum of the unigram counts, computed once per generation of the model. The compressed model
+        # ranks by probabilities instead, which sum to 1
+        if self._totals is None or self._totals[0] != self.generation:
+            if self.model == 'compressed':
+                model = self.bigram_model
+                self._totals = (self.generation, 1, math.exp(float(model.unigram_codebook[model.unigram_codes[model.known]].max())))
+            else:
+                counts = self.bigram_model.unigram_counts
+                self._totals = (self.generation, int(counts.sum()), int(counts.max()))
+        return self._totals[1], self._totals[2]
+
+    @metrics.timed('engine_suggestions_seconds')
+    def suggestions(self, word: str, k: int = None) -> List[str]:
+        """
+        Every suggestion for a misspelled word, or with k only the k best ones, best first.
+        """
+        if k is None:
+            corr_flag, suggestions = self._spell_check(word)
+            return suggestions.copy() if corr_flag is False else suggestions
+
+        key = ('top', word.lower(), k)
+        with self._model_lock:
+            result = self.non_word_cache.get(key)
+            if result is None:
+                total, max_count = self._unigram_totals()
+                result = non_word_checking.top_k_suggestions(word, k, self.alphabet, self.freq_dict_unigram,
+                                                             self.candidate_index, total, max_count)
+                self.non_word_cache.put(key, result)
+        corr_flag, suggestions = result
+        return suggestions.copy() if corr_flag is False else suggestions
+
+    @metrics.timed('engine_suggestions_context_seconds')
+    def suggestions_context(self, word: str, k: int = None) -> List[str]:
+        """
+        The candidates scoring higher than the last word of the window, or with k only the k highest scoring
+        ones, best first. The candidates are all one edit away, or all two, so the error model ranks them alike.
+        """
+        if len(word.split()) < 2:
+            return []
+        if k is None:
+            return list(self._context_suggestions(word))
+
+        key = ('top', word, k)
+        with self._model_lock:
+            result = self.context_cache.get(key)
+            if result is None and self._use_fast_accept and self._fast_accept(word.split()):
+                result = []
+            if result is None:
+                suggestion_list, score, scores = self._context_scores(word)
+                better = [(score_temp, i) for i, score_temp in sorted(zip(suggestion_list, scores)) if score < score_temp]
+                result = [i + ' (Real-word Error)' for _, i in heapq.nlargest(k, better, key=itemgetter(0))]
+                self.context_cache.put(key, result)
+        return list(result)
+
+    @metrics.timed('engine_check_seconds')
+    def check(self, word: str) -> bool:
+        corr_flag, suggestions = self._spell_check(word)
+        return corr_flag
+
+    @metrics.timed('engine_check_context_seconds')
+    def check_context(self, word: str) -> bool:
+        if len(word.split()) > 1:
+            # The word fits its context when no candidate scores higher than it
+            return len(self._context_suggestions(word)) == 0
+        else:
+            return True
+
+    def clear_caches(self):
+        """
+        Forget every cached verdict. Called whenever the language model is (re)built or updated.
+        """
+        self.non_word_cache.clear()
+        self.context_cache.clear()
+
+    def cache_info(self) -> dict:
+        return {name: {'hits': cache.hits, 'misses': cache.misses, 'size': len(cache), 'maxsize': cache.maxsize}
+                for name, cache in (('non_word', self.non_word_cache), ('context', self.context_cache))}
+
+    def _cache_gauges(self) -> dict:
+        gauges = {}
+        for name, info in self.cache_info().items():
+            for key in ('hits', 'misses', 'size'):
+                gauges['engine_%s_cache_%s' % (name, key)] = info[key]
+        return gauges
+
+
+"""
+Startup Benchmark
+"""
+# Startup-time budget in seconds for the bundled corpus, measured from a fresh interpreter
+IMPORT_BUDGET = 0.25
+LOAD_BUDGET = 0.5
+
+_STARTUP_SCRIPT = '''
+import sys, json, time
+start = time.perf_counter()
+import spell_engine
+imported = time.perf_counter()
+engine = spell_engine.SpellCheckEngine(sys.argv[1], sys.argv[2])
+engine.check('the')
+loaded = time.perf_counter()
+print(json.dumps({'import': imported - start, 'load': loaded - imported, 'qt': 'PyQt5' in sys.modules}))
+'''
+
+
+def measure_startup(file_dir: str = './data/*.txt', snapshot_path: str = './data/model.snapshot', repeat: int = 5) -> dict:
+    """
+    Time a cold import of this module and a model load in fresh interpreters, and return the medians.
+    """
+    import os
+    import sys
+    import json
+    import statistics
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, file_dir, snapshot_path],
+                                cwd=os.getcwd(), env=dict(os.environ, PYTHONPATH=here),
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+    return {'import': statistics.median(run['import'] for run in runs),
+            'load': statistics.median(run['load'] for run in runs),
+            'qt': any(run['qt'] for run in runs)}
+
+
+if __name__ == '__main__':
+    import sys
+
+    result = measure_startup()
+    print('import: %.3f s (budget %.2f s)' % (result['import'], IMPORT_BUDGET))
+    print('load:   %.3f s (budget %.2f s)' % (result['load'], LOAD_BUDGET))
+    print('PyQt5 imported: %s' % result['qt'])
+    sys.exit(0 if result['import'] <= IMPORT_BUDGET and result['load'] <= LOAD_BUDGET and not result['qt'] else 1)
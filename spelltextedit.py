@@ -7,16 +7,20 @@ References:
 
 from typing import List
 
-from PyQt5.QtCore import QEvent, Qt, pyqtSlot
-from PyQt5.QtGui import QContextMenuEvent, QMouseEvent, QTextCursor
+from PyQt5.QtCore import QEvent, QPoint, Qt, pyqtSlot
+from PyQt5.QtGui import QContextMenuEvent, QMouseEvent, QResizeEvent, QTextCursor
 from PyQt5.QtWidgets import QMenu, QTextEdit
 
 from correction_action import SpecialAction
 from highlighter import SpellCheckHighlighter
 from spellcheckwrapper import SpellCheckWrapper
+from word_index import DocumentWordIndex
 
 
 class SpellTextEdit(QTextEdit):
+    # Entries of the 'Change to' menu, the best ranked first
+    maxSuggestions = 10
+
     def __init__(self, *args):
         if args and type(args[0]) == SpellCheckWrapper:
             super().__init__(*args[1:])
@@ -24,14 +28,30 @@ class SpellTextEdit(QTextEdit):
         else:
             super().__init__(*args)
 
+        # Created before the highlighter, so it takes in every change before the highlighter formats it
+        self.wordIndex = DocumentWordIndex(self.document())
         self.highlighter = SpellCheckHighlighter(self.document())
+        self.highlighter.setWordIndex(self.wordIndex)
         if hasattr(self, 'speller'):
             self.highlighter.setSpeller(self.speller)
 
+        # Tell the highlighter which blocks are on screen, so deferred checking handles them first
+        self.verticalScrollBar().valueChanged.connect(self.updateVisibleBlocks)
+        self.document().blockCountChanged.connect(self.updateVisibleBlocks)
+
     def setSpeller(self, speller):
         self.speller = speller
         self.highlighter.setSpeller(self.speller)
 
+    def updateVisibleBlocks(self):
+        first = self.cursorForPosition(QPoint(0, 0)).blockNumber()
+        last = self.cursorForPosition(QPoint(0, self.viewport().height() - 1)).blockNumber()
+        self.highlighter.setVisibleBlocks(first, last)
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.updateVisibleBlocks()
+
     def mousePressEvent(self, event: QMouseEvent) -> None:
         if event.button() == Qt.RightButton:
             event = QMouseEvent(
@@ -46,44 +66,31 @@ class SpellTextEdit(QTextEdit):
     def contextMenuEvent(self, event: QContextMenuEvent) -> None:
         self.contextMenu = self.createStandardContextMenu(event.pos())
 
+        # Words are looked up in the word index instead of copying the document with toPlainText()
         textCursor = self.textCursor()
-        textCursor.select(QTextCursor.WordUnderCursor)
-        self.setTextCursor(textCursor)
-
-        wordToCheck = textCursor.selectedText()
-        if wordToCheck != '':
-            suggestions = self.speller.suggestions(wordToCheck)
-
-            space_count = 0
-            space_index = []
-            plainText = self.toPlainText()
-            cursor_index = textCursor.position() - 1
-            while cursor_index > 0:
-                if plainText[cursor_index].isspace():
-                    space_count += 1
-                    space_index.append(cursor_index)
-                if space_count == 2:
-                    break
-                cursor_index -= 1
+        span = self.wordIndex.wordAt(textCursor.position())
+        if span is not None:
+            start, end, wordToCheck = span
+            textCursor.setPosition(start)
+            textCursor.setPosition(end, QTextCursor.KeepAnchor)
+            self.setTextCursor(textCursor)
 
             if not self.speller.check(wordToCheck):
+                suggestions = self.speller.suggestions(wordToCheck, self.maxSuggestions)
                 self.contextMenu.addSeparator()
                 self.contextMenu.addMenu(self.createSuggestionsMenu(suggestions))
-
-            elif len(space_index) > 0:
-                if len(space_index) == 1:
-                    # word_1 = plainText[: space_index[0]]
-                    # word_2 = plainText[space_index[0] + 1: textCursor.position()]
-                    word = plainText[: textCursor.position()]
-                if len(space_index) == 2:
-                    # word_1 = plainText[space_index[1] + 1: space_index[0]]
-                    # word_2 = plainText[space_index[0] + 1: textCursor.position()]
-                    word = plainText[space_index[1] + 1: textCursor.position()]
-
-                suggestions_context = self.speller.suggestions_context(word)
-                if not self.speller.check_context(word):
-                    self.contextMenu.addSeparator()
-                    self.contextMenu.addMenu(self.createSuggestionsMenu(suggestions_context))
+                addAction = self.contextMenu.addAction('Add to Dictionary')
+                addAction.triggered.connect(lambda: self.addToDictionary(wordToCheck))
+
+            else:
+                # The word with the words before it that the context model looks at, also from previous blocks
+                history = self.wordIndex.previousWords(start, getattr(self.speller, 'context_order', 2) - 1)
+                if history:
+                    window = ' '.join(history + [wordToCheck])
+                    if not self.speller.check_context(window):
+                        suggestions_context = self.speller.suggestions_context(window, self.maxSuggestions)
+                        self.contextMenu.addSeparator()
+                        self.contextMenu.addMenu(self.createSuggestionsMenu(suggestions_context))
 
         self.contextMenu.exec_(event.globalPos())
 
@@ -96,6 +103,10 @@ class SpellTextEdit(QTextEdit):
 
         return suggestionsMenu
 
+    def addToDictionary(self, word: str):
+        self.speller.add_word(word)
+        self.highlighter.rehighlight()
+
     @pyqtSlot(str)
     def correctWord(self, word: str):
         textCursor = self.textCursor()
@@ -0,0 +1,105 @@
+"""
+Regression tests for online model updates: run with python -m pytest from the repository root.
+"""
+
+import sys
+import random
+import shutil
+import threading
+
+import pytest
+
+import ngram_model
+import non_word_checking
+import real_word_checking
+from spell_engine import SpellCheckEngine
+
+
+CORPUS = './corpus.txt'
+
+
+@pytest.fixture(scope='module')
+def sentences():
+    return non_word_checking.get_tokens(CORPUS)[1]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    shutil.copy(CORPUS, tmp_path / 'corpus.txt')
+    return SpellCheckEngine(str(tmp_path / '*.txt'), str(tmp_path / 'model.snapshot'))
+
+
+def test_apply_counts_matches_rebuilt_model():
+    unigrams = {'the': 5, 'cat': 2, 'sat': 1}
+    bigrams = {('<SOS>', 'the'): 3, ('the', 'cat'): 2, ('cat', 'sat'): 1}
+    model = real_word_checking.CompactBigramModel.from_dicts(unigrams, bigrams)
+
+    updates = [({'dog': 2, 'the': 1}, {('the', 'dog'): 2}), ({'cat': 3}, {('the', 'cat'): 1}),
+               ({'mat': 1, 'on': 1}, {('on', 'mat'): 1, ('sat', 'on'): 1})]
+    for unigram_deltas, bigram_deltas in updates:
+        for word, delta in unigram_deltas.items():
+            unigrams[word] = unigrams.get(word, 0) + delta
+        for key, delta in bigram_deltas.items():
+            bigrams[key] = bigrams.get(key, 0) + delta
+        model.apply_counts(unigram_deltas, bigram_deltas, len(unigrams))
+    buffers = model._buffers
+    model.apply_counts({'the': 1}, {}, len(unigrams))
+    unigrams['the'] += 1
+
+    rebuilt = real_word_checking.CompactBigramModel.from_dicts(unigrams, bigrams)
+    words = ['the', 'cat', 'sat', 'dog', 'mat', 'on', 'unknown']
+    for prev_word in words:
+        assert model.log_candidate_probabilities(prev_word, words) == pytest.approx(rebuilt.log_candidate_probabilities(prev_word, words))
+    assert model.log_sentence_probability('<SOS> the dog sat on the mat') == pytest.approx(rebuilt.log_sentence_probability('<SOS> the dog sat on the mat'))
+    # Updates without new words write into the buffers of the earlier updates
+    assert model._buffers is buffers
+
+
+def test_kneser_ney_updates_match_refit(sentences):
+    half = len(sentences) // 2
+    refit = ngram_model.NGramModel(3, 'kneser_ney').fit(sentences)
+    updated = ngram_model.NGramModel(3, 'kneser_ney').fit(sentences[:half])
+    for sentence in sentences[half:]:
+        updated.add_sentence(sentence.split())
+
+    assert updated.kn_counts == refit.kn_counts
+    assert updated.kn_histories == refit.kn_histories
+    assert (updated.kn_unigram_den, updated.kn_unigram_types) == (refit.kn_unigram_den, refit.kn_unigram_types)
+
+
+def test_checks_during_concurrent_updates(engine):
+    # New words get IDs while a second thread checks windows containing them, as the highlighter's worker does
+    engine.check('the')
+    added = ['zzword']
+    errors = []
+    done = threading.Event()
+
+    def check():
+        rng = random.Random(0)
+        try:
+            while not done.is_set():
+                word = rng.choice(added)
+                engine.check_context('the ' + word)
+                engine.suggestions_context(word + ' the', 3)
+                engine.check(word)
+        except Exception as error:
+            errors.append(error)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    worker = threading.Thread(target=check)
+    worker.start()
+    try:
+        for i in range(300):
+            word = 'zz' + ''.join(random.Random(i).choice('abcdefghij') for _ in range(6))
+            engine.add_word(word)
+            added.append(word)
+            if i % 50 == 0:
+                engine.add_text('the %s sat on the mat.' % word)
+    finally:
+        done.set()
+        worker.join()
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    assert engine.check(added[-1])
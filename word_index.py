@@ -0,0 +1,123 @@
+"""
+References:
+    https://github.com/AshwiniRangnekar/GrammaticalErrorDetection-Correction
+    https://github.com/troublemeeter/spelling-correction
+    https://github.com/NethumL/pyqt-spellcheck
+"""
+
+import sys
+import bisect
+
+from array import array
+from typing import List, Optional, Tuple
+
+from PyQt5.QtCore import QObject
+from PyQt5.QtGui import QTextBlock, QTextDocument
+
+from non_word_checking import wordRegEx
+
+
+class DocumentWordIndex(QObject):
+    """
+    Positions of the words of a QTextDocument, found with the highlighter's wordRegEx. Every block has the start
+    offsets of its words and the words themselves (interned, so repeated words are stored once), in a list indexed
+    by block number. Only the blocks touched by a contentsChange are indexed again.
+    A lookup finds the block with QTextDocument.findBlock and the word with a binary search, both O(log n);
+    previous and next words continue into the neighbouring blocks, skipping blocks without words.
+    The index must be created before a QSyntaxHighlighter of the document, so it is updated before the
+    highlighter formats the changed blocks. The document needs a layout, as in a QTextEdit; without one,
+    QTextDocument does not report its changes.
+    """
+    def __init__(self, document: QTextDocument):
+        super().__init__(document)
+        self.document = document
+        # Block number -> (start offsets inside the block, words)
+        self.blocks: List[Tuple[array, List[str]]] = []
+        self.reindex()
+        document.contentsChange.connect(self.onContentsChange)
+
+    def indexBlock(self, block: QTextBlock) -> Tuple[array, List[str]]:
+        matches = list(wordRegEx.finditer(block.text()))
+        return array('l', [m.start() for m in matches]), [sys.intern(m.group()) for m in matches]
+
+    def reindex(self):
+        self.blocks = []
+        block = self.document.begin()
+        while block.isValid():
+            self.blocks.append(self.indexBlock(block))
+            block = block.next()
+
+    def onContentsChange(self, position: int, charsRemoved: int, charsAdded: int):
+        document = self.document
+        first = document.findBlock(position)
+        last = document.findBlock(min(position + charsAdded, document.characterCount() - 1))
+        if not first.isValid() or not last.isValid():
+            self.reindex()
+            return
+        # The changed span covered oldLast - first + 1 blocks before the change
+        oldLast = last.blockNumber() - (document.blockCount() - len(self.blocks))
+        if oldLast < first.blockNumber() - 1 or oldLast >= len(self.blocks):
+            self.reindex()
+            return
+
+        indexed = []
+        block = first
+        while block.isValid() and block.blockNumber() <= last.blockNumber():
+            indexed.append(self.indexBlock(block))
+            block = block.next()
+        self.blocks[first.blockNumber():oldLast + 1] = indexed
+
+    def wordAt(self, position: int) -> Optional[Tuple[int, int, str]]:
+        """
+        (start, end, word) of the word containing position, or ending right before it, in document positions.
+        """
+        block = self.document.findBlock(position)
+        if not block.isValid():
+            return None
+        starts, words = self.blocks[block.blockNumber()]
+        i = bisect.bisect_right(starts, position - block.position()) - 1
+        if i < 0:
+            return None
+        start = block.position() + starts[i]
+        end = start + len(words[i])
+        return (start, end, words[i]) if position <= end else None
+
+    def previousWords(self, position: int, count: int) -> List[str]:
+        """
+        The count words (fewer at the start of the document) ending at or before position, nearest last.
+        """
+        block = self.document.findBlock(position)
+        if not block.isValid() or count <= 0:
+            return []
+        blockNumber = block.blockNumber()
+        starts, words = self.blocks[blockNumber]
+        offset = position - block.position()
+        i = bisect.bisect_right(starts, offset) - 1
+        # A word containing position does not end before it
+        if i >= 0 and starts[i] + len(words[i]) > offset:
+            i -= 1
+        result = words[max(0, i + 1 - count):i + 1]
+        while len(result) < count and blockNumber > 0:
+            blockNumber -= 1
+            words = self.blocks[blockNumber][1]
+            result = words[max(0, len(words) - count + len(result)):] + result
+        return result
+
+    def nextWord(self, position: int) -> Optional[Tuple[int, int, str]]:
+        """
+        (start, end, word) of the first word starting after position, in document positions.
+        """
+        block = self.document.findBlock(position)
+        if not block.isValid():
+            return None
+        blockNumber = block.blockNumber()
+        starts, words = self.blocks[blockNumber]
+        i = bisect.bisect_right(starts, position - block.position())
+        while i >= len(words):
+            blockNumber += 1
+            if blockNumber >= len(self.blocks):
+                return None
+            (starts, words), i = self.blocks[blockNumber], 0
+            block = self.document.findBlockByNumber(blockNumber)
+        start = block.position() + starts[i]
+        return start, start + len(words[i]), words[i]